@@ -1,14 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from model.guess import Guess
 from model.answer import Answer
 from flask_cors import CORS, cross_origin
-from src.filter import find_bird, fetch_db
-from src.claude_1a import claude_1
-from src.utils import update_and_join ,server_setup
+from src.filter import find_bird
+from src.catalog import get_catalog
+from src.claude_1a import claude_1, prompt_sizes, build_static_prompt, build_user_prompt, restrict_to_vocabulary
+from src.stream_extract import claude_1_stream
+from src.tool_extract import claude_1_tool, extraction_tool, SYSTEM_PROMPT
+from src.utils import update_and_join ,server_setup, vocabulary_hash
 from src.claude_summary import claude_summary
-from src.formatData import formatData, save_user_data
+from src.formatData import formatData, save_user_data, configure_log, configure_writer, configure_db
+from src.policy import load_policy
+from src.extraction_cache import ExtractionCache
+from src.lexicon import Lexicon
+from src.async_extract import AsyncExtractor, ExtractionUnavailable
+from src.breaker import CircuitBreaker, CircuitOpenError
+from src.summaries import SummaryService
+from src.export import parse_time, parse_bool, export_lines, export_chunks
+from src import metrics, llm
 from dotenv import load_dotenv
+import hashlib
+import hmac
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 cors = CORS(app)
@@ -16,19 +31,109 @@ load_dotenv()
 app.config['CORS_HEADERS'] = 'Content-Type'
 with open('config.json') as config_file:
     app.config.update(json.load(config_file))
+llm.configure(app.config.get("llm"))
 all_words = server_setup(app.config["key_features"])
+vocab_hash = vocabulary_hash(all_words)
+policy = load_policy(app.config.get("question_policy"))
+if policy:
+    metrics.register("question_policy", policy.stats)
+extraction_cache = ExtractionCache(**app.config["extraction_cache"]) if app.config.get("extraction_cache") else None
+if extraction_cache:
+    metrics.register("extraction_cache", extraction_cache.stats)
+metrics.register("llm_usage", llm.usage_stats)
+metrics.register("user_data_log", configure_log(app.config.get("user_data_log")).stats)
+db_config = dict(app.config.get("analytics_db") or {})
+analytics_db = configure_db(db_config) if db_config.pop("enabled", False) else None
+writer_config = dict(app.config.get("user_data_writer") or {})
+if writer_config.pop("enabled", False):
+    metrics.register("user_data_writer", configure_writer(writer_config).stats)
+metrics.register("extraction_prompt_tokens", lambda: prompt_sizes(all_words))
+lexicon = Lexicon(all_words) if app.config.get("lexicon_fast_path") else None
+if lexicon:
+    metrics.register("lexicon", lexicon.stats)
+async_config = dict(app.config.get("async_extraction") or {})
+async_extractor = AsyncExtractor(stream=app.config.get("stream_extraction", False), mode=app.config.get("extraction_mode", "xml"), **async_config) if async_config.pop("enabled", False) else None
+if async_extractor:
+    metrics.register("async_extraction", async_extractor.stats)
+breaker_config = dict(app.config.get("circuit_breaker") or {})
+llm_breaker = CircuitBreaker(**breaker_config) if breaker_config.pop("enabled", False) else None
+if llm_breaker:
+    metrics.register("llm_circuit_breaker", llm_breaker.stats)
+summary_config = dict(app.config.get("summary") or {})
+summary_max_wait = summary_config.pop("max_wait", 10)
+summaries = SummaryService(claude_summary, **summary_config) if summary_config.pop("enabled", False) else None
+if summaries:
+    metrics.register("summaries", summaries.stats)
 
-def process_bird_data(json_data):
-    request_data = Guess(
-        id=json_data["birdId"], #id for game mode
-        message=json_data["message"],
-        category_prompt=json_data["categoryPrompt"],
-        categories=json_data["categories"],
-        user_data=json_data["user_data"]
+def llm_extract(user_input: str, category_prompt: str, all_words: dict) -> dict:
+    if async_extractor:
+        extractor = async_extractor.extract
+    elif app.config.get("extraction_mode") == "tool":
+        extractor = claude_1_tool
+    else:
+        extractor = claude_1_stream if app.config.get("stream_extraction") else claude_1
+    try:
+        if llm_breaker:
+            return llm_breaker.call(extractor, user_input, category_prompt, all_words)
+        return extractor(user_input, category_prompt, all_words)
+    except (ExtractionUnavailable, CircuitOpenError):
+        raise
+    except Exception as e:
+        #an api error falls back to the lexicon like a missed deadline, whichever path made the call
+        raise ExtractionUnavailable(f"{type(e).__name__}: {e}") from e
+
+def extraction_mode() -> str:
+    if app.config.get("extraction_mode") == "tool":
+        return "tool"
+    return "streaming" if app.config.get("stream_extraction") else "xml"
+
+#cache version per (mode, prompted category), the prompts only change with a new vocabulary or deploy
+_extraction_versions = {}
+
+def extraction_version(category_prompt: str) -> str:
+    """this function names what a cached extraction depends on besides the message: mode, prompt or tool schema and vocabulary"""
+    mode = extraction_mode()
+    key = (mode, category_prompt)
+    version = _extraction_versions.get(key)
+    if version is None:
+        if mode == "tool":
+            prompt = SYSTEM_PROMPT + json.dumps(extraction_tool(all_words), sort_keys=True)
+        else:
+            prompt = build_static_prompt(all_words, category_prompt)
+        prompt += build_user_prompt("", category_prompt)
+        version = f"{mode}:{vocab_hash}:{hashlib.sha1(prompt.encode()).hexdigest()[:12]}"
+        _extraction_versions[key] = version
+    return version
+
+def parse_guess(json_data) -> Guess:
+    return Guess(
+        id=json_data.get("birdId"), #id for game mode
+        message=json_data.get("message"),
+        category_prompt=json_data.get("categoryPrompt"),
+        categories=json_data.get("categories") or {},
+        user_data=json_data.get("user_data")
     )
+
+def interpret_message(request_data: Guess) -> dict:
     #claude interpret input
     if request_data.message:
-        dic = claude_1(request_data.message, request_data.category_prompt, all_words)
+        #fully recognized messages skip the llm
+        dic = lexicon.extract(request_data.message, request_data.category_prompt) if lexicon else None
+        if dic is None:
+            try:
+                if extraction_cache:
+                    dic = extraction_cache.extract(llm_extract, request_data.message, request_data.category_prompt, all_words, extraction_version(request_data.category_prompt))
+                else:
+                    dic = llm_extract(request_data.message, request_data.category_prompt, all_words)
+            except (ExtractionUnavailable, CircuitOpenError) as e:
+                #deadline missed or llm failing: keep what we can read locally, the known categories are joined below
+                print(f"extraction unavailable: {e}")
+                dic = lexicon.extract_known(request_data.message, request_data.category_prompt) if lexicon else {}
+                #plus the categories the llm streamed before failing
+                #a scoped answer writes the other categories in plain words the catalog doesn't know
+                partial = restrict_to_vocabulary(dict(getattr(e, "partial", None) or {}), all_words, request_data.category_prompt)
+                partial = {key: value for key, value in partial.items() if isinstance(value, str)}
+                dic = update_and_join(dic, partial)
 
         #join new to old dictionnary
         dic = update_and_join(dic, request_data.categories)
@@ -38,25 +143,22 @@ def process_bird_data(json_data):
             dic[request_data.category_prompt] = None
     else:
         dic = request_data.categories
+    return dic
 
-
-    #find next best question + filtering
-    question, error, matches = find_bird(dic, app.config['birds_left'], app.config['key_features'], request_data.id, app.config['match_count'])
+def build_answer(request_data: Guess, dic: dict, question, error, matches) -> Answer:
     #get sumamry from claude
     if dic:
-        summary = ""
-        pass
-        #custom clause summary
-        # summary = claude_summary(dic)
+        #generated in the background, returned once ready or fetched from /summary
+        summary = (summaries.get(dic) if summaries else None) or ""
     else:
         summary = "We couldn't manage to get any informations from your input"
 
     #format user data
-    user_data = formatData(dic, request_data.message, request_data.user_data, error)
+    user_data = formatData(dic, request_data.message or "", request_data.user_data, error)
 
     #if found birds or error we save user data
     if matches or not question or error:
-        save_user_data(user_data, matches)
+        save_user_data(user_data, matches, request_data.id)
 
     response_data = Answer(
         isConfused = False,
@@ -68,6 +170,56 @@ def process_bird_data(json_data):
     )
     return response_data
 
+def process_bird_data(json_data):
+    request_data = parse_guess(json_data)
+    dic = interpret_message(request_data)
+    if summaries and dic:
+        summaries.start(dic)
+
+    #find next best question + filtering
+    question, error, matches = find_bird(dic, app.config['birds_left'], app.config['key_features'], request_data.id, app.config['match_count'], app.config.get('question_strategy', 'avg_max'), policy, app.config.get('ranking'))
+    return build_answer(request_data, dic, question, error, matches)
+
+def batch_item_error(item) -> str:
+    """this function returns why a batch item can't be processed, None when it looks valid"""
+    if not isinstance(item, dict):
+        return 'Each item must be a JSON object'
+    if item.get('categories') is not None and not isinstance(item['categories'], dict):
+        return 'categories must be a JSON object'
+    if item.get('message') is not None and not isinstance(item['message'], str):
+        return 'message must be a string'
+    return None
+
+def process_bird_batch(items: list) -> list:
+    #llm calls run concurrently, a failing item doesn't fail the batch
+    def interpret(item):
+        error = batch_item_error(item)
+        if error:
+            return None, None, error
+        try:
+            request_data = parse_guess(item)
+            return request_data, interpret_message(request_data), None
+        except Exception as e:
+            return None, None, str(e)
+    with ThreadPoolExecutor(max_workers=app.config.get('batch_llm_concurrency', 8)) as pool:
+        interpreted = list(pool.map(interpret, items))
+
+    #every item is filtered against the same catalog snapshot
+    catalog = get_catalog()
+    responses = []
+    for request_data, dic, error in interpreted:
+        if error is not None:
+            responses.append({'error': error})
+            continue
+        try:
+            if summaries and dic:
+                summaries.start(dic)
+            question, game_error, matches = find_bird(dic, app.config['birds_left'], app.config['key_features'], request_data.id, app.config['match_count'], app.config.get('question_strategy', 'avg_max'), policy, app.config.get('ranking'), catalog)
+            responses.append(build_answer(request_data, dic, question, game_error, matches).to_dict())
+        except Exception as e:
+            responses.append({'error': str(e)})
+    return responses
+
 @app.route('/birds', methods=['POST'])
 @cross_origin()
 def birds():
@@ -84,12 +236,77 @@ def birds():
     else:
         return jsonify({'error': 'Method not allowed'}), 405
 
+@app.route('/birds/batch', methods=['POST'])
+@cross_origin()
+def birds_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+        return jsonify({'error': 'Expected a JSON object with an items list'}), 400
+    if len(data['items']) > app.config.get('batch_max_items', 50):
+        return jsonify({'error': f"A batch can contain at most {app.config.get('batch_max_items', 50)} items"}), 413
+
+    processed_data = process_bird_batch(data['items'])
+
+    return jsonify({'message': 'Bird batch processed successfully', 'data': processed_data}), 200
+
+@app.route('/summary', methods=['POST'])
+@cross_origin()
+def get_summary():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('categories'), dict):
+        return jsonify({'error': 'Expected a JSON object with a categories object'}), 400
+    if not summaries:
+        return jsonify({'error': 'Summaries are disabled'}), 404
+    try:
+        wait = min(max(float(data.get('wait') or 0), 0), summary_max_wait)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+
+    summary = summaries.get(data['categories'], wait)
+    if summary is None:
+        return jsonify({'status': 'pending'}), 202
+    return jsonify({'status': 'ready', 'summary': summary}), 200
+
 @app.route('/new-bird', methods=['GET'])
 def get_bird():
     if request.method == 'GET':
-        bird = fetch_db(None, None, True)
+        bird = get_catalog().random()
         return jsonify({"id": bird['species_number'], "image": bird['picture']})
     return jsonify({'error': 'Method not allowed'}), 405
 
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    if not analytics_db:
+        return jsonify({'error': 'The analytics database is disabled'}), 404
+    catalog = get_catalog()
+    return jsonify(analytics_db.stats(lambda bird_id: (catalog.get(bird_id) or {}).get('name')))
+
+@app.route('/export', methods=['GET'])
+def export_conversations():
+    token = os.getenv('EXPORT_TOKEN')
+    if not token:
+        return jsonify({'error': 'The export is disabled, set EXPORT_TOKEN to enable it'}), 404
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+        game_mode = parse_bool(request.args.get('game_mode'))
+        compress = bool(parse_bool(request.args.get('gzip')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    directory = (app.config.get('user_data_log') or {}).get('directory', 'data/user_data')
+    lines = export_lines(directory, 'data/user_data.json', since, until, game_mode)
+    headers = {'Content-Disposition': 'attachment; filename=conversations.ndjson'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(export_chunks(lines, compress), mimetype='application/x-ndjson', headers=headers)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify(metrics.snapshot())
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0")
\ No newline at end of file
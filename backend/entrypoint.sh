@@ -1,10 +1,12 @@
 #!/bin/bash
 set -e
 
-trap "kill -TERM $child" SIGTERM
-trap "kill -INT $child" SIGINT
+#single quotes: $child is read when the signal arrives, not when the trap is set
+trap 'kill -TERM $child' SIGTERM
+trap 'kill -INT $child' SIGINT
 
 gunicorn -w 4 -b 0.0.0.0:5000 app:app &
 child=$!
 
-wait "$child"
\ No newline at end of file
+#a trapped signal ends the first wait, the second one lets gunicorn finish draining
+wait "$child" || wait "$child"
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+from src.sqlite_store import SqliteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL,
+    game_mode INTEGER NOT NULL,
+    bird_id INTEGER,
+    correct INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    average_message_length REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_created ON conversations (created_at);
+CREATE INDEX IF NOT EXISTS conversations_game ON conversations (game_mode, created_at);
+CREATE INDEX IF NOT EXISTS conversations_bird ON conversations (bird_id);
+CREATE TABLE IF NOT EXISTS turns (
+    conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    categories TEXT NOT NULL,
+    new_attribute TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, position)
+);
+CREATE TABLE IF NOT EXISTS suggestions (
+    conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+    rank INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, rank)
+);
+CREATE INDEX IF NOT EXISTS suggestions_name ON suggestions (name);
+CREATE TABLE IF NOT EXISTS errors (
+    conversation_id INTEGER NOT NULL REFERENCES conversations (id),
+    category TEXT NOT NULL,
+    adjective TEXT NOT NULL,
+    bird_value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS errors_conversation ON errors (conversation_id);
+CREATE INDEX IF NOT EXISTS errors_category ON errors (category);
+CREATE TABLE IF NOT EXISTS rollup_totals (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_bird_accuracy (
+    bird_id INTEGER PRIMARY KEY,
+    games INTEGER NOT NULL,
+    wrong INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_turns (
+    turns INTEGER PRIMARY KEY,
+    conversations INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_categories (
+    category TEXT PRIMARY KEY,
+    uses INTEGER NOT NULL
+);
+"""
+
+def increment(db: sqlite3.Connection, table: str, key_column: str, key, values: dict) -> None:
+    """this function adds values to a rollup row, creating it on first use"""
+    columns = list(values)
+    db.execute(
+        f"INSERT INTO {table} ({key_column}, {', '.join(columns)}) VALUES ({', '.join('?' * (len(columns) + 1))}) "
+        f"ON CONFLICT ({key_column}) DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in columns)}",
+        [key, *values.values()])
+
+
+class AnalyticsDB:
+    """
+    Sqlite copy of the conversation log with indexed tables per conversation,
+    turn, suggestion and game error. Rollup tables are updated in the same
+    transaction as the inserts, so reading the stats never scans the history.
+    WAL mode lets every gunicorn worker write while others read.
+    """
+    def __init__(self, path: str="data/analytics.db"):
+        self.path = path
+        self.written = 0
+        #rebuilds and busy workers can hold the write lock for a while
+        self._connections = SqliteConnections(path, SCHEMA, timeout=30)
+
+    def _db(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def add(self, records: list) -> None:
+        """this function stores finished conversations (save_user_data records) and updates the rollups"""
+        db = self._db()
+        with db:
+            for record in records:
+                self._add(db, record)
+        self.written += len(records)
+
+    def _add(self, db: sqlite3.Connection, record: dict) -> None:
+        user_data = record.get("user_data") or {}
+        response = record.get("app_response") or {}
+        conversation = user_data.get("conversation") or []
+        try:
+            bird_id = int(record["bird_id"]) if record.get("bird_id") is not None else None
+        except (TypeError, ValueError):
+            bird_id = None
+        game_mode = bool(record.get("game_mode", bird_id is not None))
+        correct = bool(response.get("correct", True))
+        cursor = db.execute(
+            "INSERT INTO conversations (created_at, game_mode, bird_id, correct, turns, average_message_length) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (record.get("saved_at"), game_mode, bird_id, correct, len(conversation),
+             user_data.get("average_message_length") or 0))
+        conversation_id = cursor.lastrowid
+        db.executemany(
+            "INSERT INTO turns (conversation_id, position, text, length, categories, new_attribute) VALUES (?, ?, ?, ?, ?, ?)",
+            [(conversation_id, position, turn.get("text") or "", turn.get("length") or 0,
+              json.dumps(turn.get("categories_described") or {}), json.dumps(turn.get("new_attribute") or {}))
+             for position, turn in enumerate(conversation)])
+        db.executemany(
+            "INSERT INTO suggestions (conversation_id, rank, name) VALUES (?, ?, ?)",
+            [(conversation_id, rank, name) for rank, name in enumerate(response.get("suggestions") or [])])
+        db.executemany(
+            "INSERT INTO errors (conversation_id, category, adjective, bird_value) VALUES (?, ?, ?, ?)",
+            [(conversation_id, str(error.get("category")), str(error.get("adjective")), str(error.get("bird_value")))
+             for error in user_data.get("error") or [] if isinstance(error, dict)])
+
+        words = sum(turn.get("length") or 0 for turn in conversation)
+        for name, value in (("conversations", 1), ("turns", len(conversation)), ("words", words),
+                            ("games", int(game_mode)), ("wrong", int(not correct)),
+                            ("wrong_games", int(game_mode and not correct))):
+            increment(db, "rollup_totals", "name", name, {"value": value})
+        increment(db, "rollup_turns", "turns", len(conversation), {"conversations": 1})
+        if game_mode and bird_id is not None:
+            increment(db, "rollup_bird_accuracy", "bird_id", bird_id, {"games": 1, "wrong": int(not correct)})
+        #every turn carries the whole category state, the last one has all the described categories
+        categories = (conversation[-1].get("categories_described") or {}) if conversation else {}
+        for category, value in categories.items():
+            if value:
+                increment(db, "rollup_categories", "category", category, {"uses": 1})
+
+    def stats(self, name_of=None) -> dict:
+        """this function reads the rollups, name_of(bird_id) gives the bird names"""
+        db = self._db()
+        totals = dict(db.execute("SELECT name, value FROM rollup_totals").fetchall())
+        conversations = int(totals.get("conversations", 0))
+        games = int(totals.get("games", 0))
+        turns = totals.get("turns", 0)
+        birds = []
+        for bird_id, bird_games, wrong in db.execute(
+                "SELECT bird_id, games, wrong FROM rollup_bird_accuracy ORDER BY games DESC, bird_id"):
+            birds.append({"bird_id": bird_id, "name": name_of(bird_id) if name_of else None, "games": bird_games,
+                          "wrong": wrong, "accuracy": round(1 - wrong / bird_games, 4)})
+        return {
+            "conversations": conversations,
+            "games": games,
+            "wrong": int(totals.get("wrong", 0)),
+            "game_accuracy": round(1 - totals.get("wrong_games", 0) / games, 4) if games else None,
+            "average_message_length": round(totals.get("words", 0) / turns, 2) if turns else 0,
+            "turns_per_session": {
+                "average": round(turns / conversations, 2) if conversations else 0,
+                "histogram": dict(db.execute("SELECT turns, conversations FROM rollup_turns ORDER BY turns").fetchall()),
+            },
+            "categories": dict(db.execute("SELECT category, uses FROM rollup_categories ORDER BY uses DESC, category").fetchall()),
+            "birds": birds,
+        }
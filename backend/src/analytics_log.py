@@ -0,0 +1,209 @@
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+
+FSYNC_POLICIES = ("always", "interval", "never")
+SEGMENT_PATTERN = re.compile(r"^user_data-(\d{6})\.jsonl$")
+
+def segment_name(number: int) -> str:
+    return f"user_data-{number:06d}.jsonl"
+
+def segment_number(path: str) -> int:
+    return int(SEGMENT_PATTERN.match(os.path.basename(path)).group(1))
+
+def list_segments(directory: str) -> list:
+    """this function returns the segment paths of a log directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    numbers = sorted(int(m.group(1)) for m in map(SEGMENT_PATTERN.match, os.listdir(directory)) if m)
+    return [os.path.join(directory, segment_name(number)) for number in numbers]
+
+
+class AnalyticsLog:
+    """
+    Append-only log of finished conversations, one json record per line.
+    Writes take an flock so every gunicorn worker can append to the same
+    segment; a segment over max_segment_bytes is closed and the next number
+    started. fsync is done on every write (always), at most every
+    fsync_interval seconds (interval) or left to the os (never).
+    """
+    def __init__(self, directory: str="data/user_data", fsync: str="interval", fsync_interval: float=1.0,
+                 max_segment_bytes: int=16 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.records = 0
+        self.rotations = 0
+        self._file = None
+        self._number = None
+        self._pid = None
+        self._last_fsync = 0.0
+        self._lock = threading.Lock()
+
+    def _open(self, number: int) -> None:
+        if self._file:
+            self._file.close()
+        self._file = open(os.path.join(self.directory, segment_name(number)), "ab")
+        self._number = number
+        self._pid = os.getpid()
+
+    def _current(self) -> None:
+        if self._file is None or self._pid != os.getpid():
+            self._file = None
+            os.makedirs(self.directory, exist_ok=True)
+            segments = list_segments(self.directory)
+            self._open(segment_number(segments[-1]) if segments else 1)
+
+    def _next_segment(self) -> None:
+        """this function moves to the segment another worker started, or starts the next one"""
+        newest = segment_number(list_segments(self.directory)[-1])
+        if newest > self._number:
+            self._open(newest)
+        else:
+            self._open(self._number + 1)
+            self.rotations += 1
+
+    def encode(self, record: dict) -> bytes:
+        return (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode()
+
+    def append(self, record: dict) -> None:
+        self.write_lines([self.encode(record)])
+
+    def write_lines(self, lines: list) -> None:
+        """this function appends encoded records with a single write and at most one fsync"""
+        with self._lock:
+            self._current()
+            #the size is checked under the flock, closing a full segment releases it
+            while True:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                if os.fstat(self._file.fileno()).st_size < self.max_segment_bytes:
+                    break
+                self._next_segment()
+            try:
+                #one write call per batch so readers never see records of two workers interleaved
+                self._file.write(b"".join(lines))
+                self._file.flush()
+                now = time.monotonic()
+                if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+                    os.fsync(self._file.fileno())
+                    self._last_fsync = now
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self.records += len(lines)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "records": self.records,
+            "rotations": self.rotations,
+            "segment": self._number,
+            "fsync": self.fsync,
+        }
+
+
+def iter_json_array(file, chunk_size: int=64 * 1024):
+    """this function yields the items of a json array one at a time, reading the file in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("expected a json array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                #the item continues in the next chunk
+                break
+            #a number can be cut at the end of a chunk
+            if end == len(buffer) and chunk:
+                break
+            yield item
+            position = end
+        if not chunk:
+            raise ValueError("unterminated json array")
+
+def iter_entries(directory: str="data/user_data", legacy_path: str="data/user_data.json", since: float=None,
+                 counts: dict=None):
+    """
+    Yield every conversation as (encoded json line, record): the old json
+    array first, then the log segments in order. With since, the legacy
+    records (which have no timestamp) and the segments last written before it
+    are skipped without being read. Lines that don't decode to a record, like
+    one torn by a crash and continued by the next write, are skipped and
+    counted in counts["skipped"].
+    """
+    if legacy_path and since is None and os.path.exists(legacy_path):
+        with open(legacy_path) as file:
+            for record in iter_json_array(file):
+                yield (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode(), record
+    for path in list_segments(directory):
+        if since is not None and os.path.getmtime(path) < since:
+            continue
+        with open(path, "rb") as file:
+            for line in file:
+                #a crash can leave the last line of a segment half written
+                if not line.endswith(b"\n"):
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if not isinstance(record, dict):
+                    if counts is not None:
+                        counts["skipped"] = counts.get("skipped", 0) + 1
+                    continue
+                yield line, record
+
+def iter_lines(directory: str="data/user_data", legacy_path: str="data/user_data.json", since: float=None,
+               counts: dict=None):
+    """this function yields every conversation as one encoded json line, see iter_entries"""
+    for line, _ in iter_entries(directory, legacy_path, since, counts):
+        yield line
+
+def iter_records(directory: str="data/user_data", legacy_path: str="data/user_data.json", counts: dict=None):
+    """this function yields every conversation: the old json array first, then the log segments in order"""
+    for _, record in iter_entries(directory, legacy_path, counts=counts):
+        yield record
+
+def export_json(out, directory: str="data/user_data", legacy_path: str="data/user_data.json", counts: dict=None) -> int:
+    """this function writes the log as the json array user_data.json used to be, streaming record by record"""
+    count = 0
+    out.write("[")
+    for record in iter_records(directory, legacy_path, counts):
+        out.write(",\n" if count else "\n")
+        out.write("\n".join("    " + line for line in json.dumps(record, indent=4).split("\n")))
+        count += 1
+    out.write("\n]" if count else "]")
+    return count
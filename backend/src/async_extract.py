@@ -0,0 +1,181 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import deque
+from src.claude_1a import extraction_request, parse_extraction, restrict_to_vocabulary
+from src.llm import create_async_client, record_usage, record_parse
+from src.stream_extract import SightingStreamParser, streaming_request
+from src.tool_extract import tool_request, parse_tool_extraction
+
+EXTRACTION_MODES = ("xml", "tool")
+
+class ExtractionUnavailable(Exception):
+    """the llm extraction missed its deadline or failed, the caller should fall back to local data"""
+    def __init__(self, message: str, partial: dict=None):
+        super().__init__(message)
+        #categories already streamed in before the deadline
+        self.partial = partial or {}
+
+
+class LatencyTracker:
+    """rolling window of call latencies in seconds"""
+    def __init__(self, size: int=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, p: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+class AsyncExtractor:
+    """
+    Runs claude_1 extractions on a per worker asyncio loop so a sync gunicorn
+    worker only waits up to the deadline. When the first request is slower
+    than the hedge percentile of recent calls a second identical request is
+    sent and the first answer wins; the other one is cancelled. With stream
+    the answer is parsed as it arrives, so a missed deadline still keeps the
+    categories that were complete. The tool mode asks for the compact tool
+    answer instead of xml and is never streamed.
+    """
+    def __init__(self, deadline: float=8.0, hedge: bool=True, hedge_percentile: float=0.9,
+                 hedge_min_samples: int=20, hedge_min_delay: float=1.0, stream: bool=False, mode: str="xml"):
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"unknown extraction mode: {mode}")
+        self.deadline = deadline
+        self.mode = mode
+        self.stream = stream and mode == "xml"
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.partial_results = 0
+        self._loop = None
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-extraction", daemon=True).start()
+                self._loop = loop
+                self._pid = os.getpid()
+                self._client = None
+            return self._loop
+
+    def hedge_delay(self) -> float:
+        """this function returns how long to wait before hedging, None to never hedge"""
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+
+    async def _call(self, request: dict, parsers: list):
+        if self._client is None:
+            self._client = create_async_client()
+        start = time.monotonic()
+        if not self.stream:
+            message = await self._client.messages.create(**request)
+            self.latency.add(time.monotonic() - start)
+            return message, None
+        parser = SightingStreamParser()
+        parsers.append(parser)
+        async with self._client.messages.stream(**request) as stream:
+            async for text in stream.text_stream:
+                parser.feed(text)
+            message = await stream.get_final_message()
+        parser.close()
+        self.latency.add(time.monotonic() - start)
+        return message, parser
+
+    async def _first_answer(self, request: dict, parsers: list):
+        tasks = {asyncio.ensure_future(self._call(request, parsers))}
+        first = next(iter(tasks))
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    tasks.add(asyncio.ensure_future(self._call(request, parsers)))
+                    self.hedged += 1
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def extract(self, user_input: str, category_prompt: str, all_words: dict) -> dict:
+        """this function returns the claude_1 result or raises ExtractionUnavailable after the deadline"""
+        self.calls += 1
+        if self.mode == "tool":
+            request = tool_request(user_input, category_prompt, all_words)
+        elif self.stream:
+            request = streaming_request(user_input, category_prompt, all_words)
+        else:
+            request = extraction_request(user_input, category_prompt, all_words)
+        parsers = []
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self._first_answer(request, parsers), self.deadline), self._get_loop())
+        try:
+            message, parser = future.result(self.deadline + 1)
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            future.cancel()
+            self.timeouts += 1
+            raise ExtractionUnavailable(f"no extraction within {self.deadline}s", self._partial(parsers))
+        except Exception as e:
+            self.errors += 1
+            raise ExtractionUnavailable(str(e), self._partial(parsers)) from e
+        if self.mode == "tool":
+            return parse_tool_extraction(message, all_words)
+        if parser is None:
+            return restrict_to_vocabulary(parse_extraction(message), all_words, category_prompt)
+        record_usage('claude_1', message.usage)
+        record_parse('claude_1', parser.parse_seconds)
+        return restrict_to_vocabulary(parser.result(), all_words, category_prompt)
+
+    def _partial(self, parsers: list) -> dict:
+        """this function returns the categories of the furthest streamed answer"""
+        partial = max((dict(parser.features) for parser in list(parsers)), key=len, default={})
+        if partial:
+            self.partial_results += 1
+        return partial
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "partial_results": self.partial_results,
+            "p50": self.latency.percentile(0.5),
+            "p90": self.latency.percentile(0.9),
+            "p99": self.latency.percentile(0.99),
+        }
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """the dependency is failing, the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of the last `window` calls; a call raising or slower
+    than slow_call seconds is a failure. Above error_rate (once min_calls are
+    known) the breaker opens and rejects calls for cooldown seconds, then
+    half-opens to let one probe through: success closes it, failure reopens it.
+    """
+    def __init__(self, window: int=20, min_calls: int=10, error_rate: float=0.5, slow_call: float=6.0,
+                 cooldown: float=30.0):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        #the cooldown ends on its own, not on the next call
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probing = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._refresh()
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool, latency: float) -> None:
+        failure = not success or latency > self.slow_call
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failure:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failure)
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls and self.failure_rate() >= self.error_rate:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+
+    def failure_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def call(self, fn, *args, **kwargs):
+        """this function runs fn through the breaker, raises CircuitOpenError when it is open"""
+        if not self.allow():
+            raise CircuitOpenError(f"circuit {self.state}")
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self.state,
+                "failure_rate": round(self.failure_rate(), 4),
+                "calls_in_window": len(self._outcomes),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """thread safe least recently used cache with hit/miss counters and an optional ttl in seconds"""
+    def __init__(self, maxsize: int=1024, ttl: float=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def validate(self, generation) -> None:
+        """this function drops every entry when the data the cache was built from changed"""
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self._data.clear()
+                self._generation = generation
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                value, stored_at = self._data[key]
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """this function returns the cached value or computes and stores it"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+        }
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+from src.columns import FeatureColumn
+from src.index import AttributeIndex, iter_bits
+from src.scoring import MatchMatrix
+
+class Catalog:
+    """
+    Immutable in-memory snapshot of the birdInfo table. Rows are kept as dicts
+    for the api responses; matching runs on pre-tokenized feature columns.
+    """
+    def __init__(self, birds: list, version: str):
+        self.birds = tuple(birds)
+        self.version = version
+        self.index = AttributeIndex(self.column, len(self.birds))
+        self._columns = {}
+        self._matrices = {}
+        self._lock = threading.RLock()
+        self._rows_by_species = {}
+        for row, bird in enumerate(self.birds):
+            self._rows_by_species.setdefault(bird.get('species_number'), row)
+
+    def __len__(self) -> int:
+        return len(self.birds)
+
+    def row_of(self, species_number) -> int:
+        """this function returns the row of the first bird with this species number"""
+        try:
+            species_number = int(species_number)
+        except (TypeError, ValueError):
+            return None
+        return self._rows_by_species.get(species_number)
+
+    def get(self, species_number) -> dict:
+        row = self.row_of(species_number)
+        return None if row is None else self.birds[row]
+
+    def column(self, feature: str) -> FeatureColumn:
+        """this function returns the tokenized column of a feature, built once per snapshot"""
+        column = self._columns.get(feature)
+        if column is None:
+            with self._lock:
+                column = self._columns.get(feature)
+                if column is None:
+                    column = FeatureColumn(feature, [bird.get(feature) for bird in self.birds])
+                    self._columns[feature] = column
+        return column
+
+    def random(self) -> dict:
+        return random.choice(self.birds)
+
+    def match_matrix(self, features: list) -> MatchMatrix:
+        """this function returns the scoring matrix for these features, built once per snapshot"""
+        key = tuple(features)
+        matrix = self._matrices.get(key)
+        if matrix is None:
+            with self._lock:
+                matrix = self._matrices.get(key)
+                if matrix is None:
+                    matrix = MatchMatrix([self.column(feature) for feature in features], len(self.birds))
+                    self._matrices[key] = matrix
+        return matrix
+
+    def candidate_rows(self, dic: dict) -> list:
+        """this function returns the rows where every value matches or the column is null"""
+        return list(iter_bits(self.index.candidates(dic)))
+
+    def filter(self, dic: dict) -> list:
+        return [self.birds[i] for i in self.candidate_rows(dic)]
+
+
+def load_catalog(path: str) -> Catalog:
+    db = sqlite3.connect(path)
+    cursor = db.cursor()
+    cursor.execute("select * from birdInfo")
+    rows = cursor.fetchall()
+    column_names = [desc[0] for desc in cursor.description]
+    db.close()
+
+    birds = [dict(zip(column_names, row)) for row in rows]
+    digest = hashlib.sha1(json.dumps(birds, sort_keys=True, default=str).encode()).hexdigest()
+    return Catalog(birds, digest[:12])
+
+
+_lock = threading.Lock()
+# (path, file stamp, catalog) swapped as a single reference so readers never see a half update
+_snapshot = None
+
+def _file_stamp(path: str) -> tuple:
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def get_catalog(path: str=None) -> Catalog:
+    """this function returns the worker's catalog, reloading it when the db file changed"""
+    global _snapshot
+    path = path or os.getenv('POSTGRES_DB')
+    stamp = _file_stamp(path)
+    snapshot = _snapshot
+    if snapshot and snapshot[0] == path and snapshot[1] == stamp:
+        return snapshot[2]
+    with _lock:
+        snapshot = _snapshot
+        if not snapshot or snapshot[0] != path or snapshot[1] != stamp:
+            snapshot = (path, stamp, load_catalog(path))
+            _snapshot = snapshot
+        return snapshot[2]
@@ -1,22 +1,61 @@
-import anthropic
+from src.llm import get_client, record_usage, record_parse
+from src.utils import vocabulary_hash
 import xmltodict
 from dict2xml import dict2xml
 import json
+import time
 
-def claude_1(user_input: str, category_prompt: str, all_words: dict) -> dict:
-    client = anthropic.Anthropic()
-    category = ""
-    if category_prompt:
-        category = f"The user_input is an anwser to a question asking description for this category : {category_prompt}. Consider it strongly in your classification but still make sure it is relevant and matching one of the words"
-    
-    prompt = f"""You are a specialist in interpretation and a bird expert. Your job is to take a bird description and to interpret it and classify it in different categories in our specific wording.
+#static prompt per (vocabulary hash, prompted category), sent as a cached system block
+_static_prompts = {}
 
-Here is the user input:
-<user_input>
-{user_input}
-</user_input>
+def vocabulary_block(all_words: dict, category: str=None) -> str:
+    """this function returns the allowed values, only those of the prompted category when there is one"""
+    if category not in all_words:
+        return f"""the values to fill the XML should exclusively be taken from this JSON:
+{dict2xml(all_words)}"""
+    others = ", ".join(feature for feature in all_words if feature != category)
+    return f"""The user input answers a question about {category}. The values for {category} should exclusively be taken from this JSON:
+{dict2xml({category: all_words[category]})}
+The other categories are {others}; only fill them when the input clearly describes them, with short plain words"""
+
+def restrict_to_vocabulary(features: dict, all_words: dict, category: str=None) -> dict:
+    """this function keeps the vocabulary values of the categories the scoped prompt doesn't list, the other words go to new_attribute"""
+    if category not in all_words or not isinstance(features, dict) or "bird_sighting" in features:
+        return features
+    for feature, words in all_words.items():
+        if feature == category or feature not in features:
+            continue
+        value = features.pop(feature)
+        #a repeated tag comes back as a list
+        values = value if isinstance(value, list) else [value]
+        allowed = {word.lower(): word for word in words}
+        known, unknown = [], []
+        for part in (part.strip() for v in values if isinstance(v, str) for part in v.split(",")):
+            if part.lower() in allowed:
+                known.append(allowed[part.lower()])
+            elif part:
+                unknown.append(part)
+        if known:
+            features[feature] = ", ".join(dict.fromkeys(known))
+        if unknown:
+            new_attribute = features.get("new_attribute")
+            if not isinstance(new_attribute, dict):
+                new_attribute = {"description": new_attribute} if isinstance(new_attribute, str) else {}
+            new_attribute[feature] = ", ".join(dict.fromkeys(unknown))
+            features["new_attribute"] = new_attribute
+    return features
+
+def build_static_prompt(all_words: dict, category: str=None) -> str:
+    """this function returns the instructions, vocabulary and examples, identical for every message of a category"""
+    if category not in all_words:
+        category = None
+    key = (vocabulary_hash(all_words), category)
+    prompt = _static_prompts.get(key)
+    if prompt is None:
+        prompt = f"""You are a specialist in interpretation and a bird expert. Your job is to take a bird description and to interpret it and classify it in different categories in our specific wording.
+
+The user input is given in <user_input> tags in the user message.
 
-{category}
 Output your interpretation in the following format:
 <bird_sighting>
     <size>[BIRD SIZE]</size>
@@ -31,8 +70,7 @@ Output your interpretation in the following format:
     <feet_colour></feet_colour>
 </bird_sighting>
 
-the values to fill the XML should exclusively be taken from this JSON:
-{dict2xml(all_words)}
+{vocabulary_block(all_words, category)}
 
 Here are some important rules to follow:
 -only output in the XML format and nothing else than the XML
@@ -67,17 +105,55 @@ the output:
     </new_attribute>
 </bird_sighting>
 """
-    message = client.messages.create(
+        _static_prompts[key] = prompt
+    return prompt
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def prompt_sizes(all_words: dict) -> dict:
+    """this function returns the estimated static prompt tokens per prompted category and the saving over the full one"""
+    full = estimate_tokens(build_static_prompt(all_words))
+    sizes = {"full": full}
+    for category in all_words:
+        tokens = estimate_tokens(build_static_prompt(all_words, category))
+        sizes[category] = {"tokens": tokens, "reduction": round(1 - tokens / full, 4)}
+    return sizes
+
+def build_user_prompt(user_input: str, category_prompt: str) -> str:
+    """this function returns the small part of the prompt that changes with every message"""
+    category = ""
+    if category_prompt:
+        category = f"The user_input is an anwser to a question asking description for this category : {category_prompt}. Consider it strongly in your classification but still make sure it is relevant and matching one of the words"
+    return f"""Here is the user input:
+<user_input>
+{user_input}
+</user_input>
+
+{category}"""
+
+def extraction_request(user_input: str, category_prompt: str, all_words: dict) -> dict:
+    """this function returns the messages.create arguments of an extraction"""
+    return dict(
         model="claude-3-5-sonnet-20241022",
         max_tokens=1000,
         temperature=0,
+        system=[{
+            "type": "text",
+            "text": build_static_prompt(all_words, category_prompt),
+            "cache_control": {"type": "ephemeral"}
+        }],
         messages=[{
             "role": "user",
-            "content": [{"type": "text", "text": prompt}]
+            "content": [{"type": "text", "text": build_user_prompt(user_input, category_prompt)}]
         }]
     )
-    
+
+def parse_extraction(message) -> dict:
+    record_usage('claude_1', message.usage)
+
     xml_string = message.content[0].text if isinstance(message.content, list) else message.content.text
+    start = time.perf_counter()
     try:
         xml_dict = xmltodict.parse(xml_string)
         bird_features = json.loads(json.dumps(xml_dict))
@@ -86,6 +162,12 @@ the output:
             bird_features = {}
     except:
         return {"bird_sighting": {}}
+    finally:
+        record_parse('claude_1', time.perf_counter() - start)
     
     return bird_features
-    
\ No newline at end of file
+
+def claude_1(user_input: str, category_prompt: str, all_words: dict) -> dict:
+    client = get_client()
+    message = client.messages.create(**extraction_request(user_input, category_prompt, all_words))
+    return restrict_to_vocabulary(parse_extraction(message), all_words, category_prompt)
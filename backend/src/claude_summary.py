@@ -1,7 +1,7 @@
-import anthropic
+from src.llm import get_client, record_usage
 
 def claude_summary(cat: dict) -> str:
-    client = anthropic.Anthropic()
+    client = get_client()
     if 'new_attribute' in cat:
         del cat['new_attribute']
     prompt = f"""
@@ -41,5 +41,6 @@ def claude_summary(cat: dict) -> str:
         }]
     )
     
+    record_usage('claude_summary', message.usage)
     string = message.content[0].text if isinstance(message.content, list) else message.content.text
     return string
\ No newline at end of file
@@ -0,0 +1,46 @@
+def tokenize(value) -> list:
+    """this function splits a comma separated value (or a list of them) into lower case tokens"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    tokens = []
+    for item in value:
+        for token in str(item).split(','):
+            token = token.strip().lower()
+            if token and token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+class FeatureColumn:
+    """
+    One feature of the catalog stored column wise. Tokens are normalized to
+    lower case and interned, so a bird's value is a tuple of token ids.
+    """
+    __slots__ = ("name", "vocab", "tokens", "rows", "nulls")
+
+    def __init__(self, name: str, values: list):
+        self.name = name
+        self.vocab = {}
+        self.tokens = []
+        self.nulls = 0
+        rows = []
+        for i, value in enumerate(values):
+            if value is None:
+                self.nulls |= 1 << i
+                rows.append(())
+                continue
+            rows.append(tuple(self.intern(token) for token in tokenize(str(value))))
+        self.rows = tuple(rows)
+
+    def intern(self, token: str) -> int:
+        token_id = self.vocab.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.vocab[token] = token_id
+            self.tokens.append(token)
+        return token_id
+
+    def is_null(self, row: int) -> bool:
+        return bool(self.nulls >> row & 1)
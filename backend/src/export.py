@@ -0,0 +1,74 @@
+import datetime
+import zlib
+from src.analytics_log import iter_entries
+
+#bytes gathered before a chunk is sent, small enough to keep memory flat
+CHUNK_SIZE = 64 * 1024
+
+def parse_time(value: str) -> float:
+    """this function reads unix seconds or an ISO 8601 date, UTC when no offset is given"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+def parse_bool(value: str) -> bool:
+    if value is None or value == "":
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"not a boolean: {value}")
+
+def record_game_mode(record: dict) -> bool:
+    """this function returns the game mode of a record, older ones without the field count as a game when they name a bird"""
+    if record.get("game_mode") is not None:
+        return bool(record["game_mode"])
+    return record.get("bird_id") is not None
+
+def matches(record: dict, since: float=None, until: float=None, game_mode: bool=None) -> bool:
+    """this function applies the export filters, records without a timestamp never match a time filter"""
+    saved_at = record.get("saved_at")
+    if since is not None and (saved_at is None or saved_at < since):
+        return False
+    if until is not None and (saved_at is None or saved_at >= until):
+        return False
+    if game_mode is not None and record_game_mode(record) is not game_mode:
+        return False
+    return True
+
+def export_lines(directory: str, legacy_path: str, since: float=None, until: float=None, game_mode: bool=None):
+    """this function yields the ndjson lines of the matching conversations, unchanged from the log"""
+    counts = {}
+    for line, record in iter_entries(directory, legacy_path, since, counts):
+        if matches(record, since, until, game_mode):
+            yield line
+    if counts.get("skipped"):
+        print(f"export skipped {counts['skipped']} undecodable log lines")
+
+def export_chunks(lines, compress: bool=False):
+    """this function groups lines in chunks of about CHUNK_SIZE bytes, gzipped on the fly when asked"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            chunk = b"".join(buffer)
+            buffer = []
+            size = 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
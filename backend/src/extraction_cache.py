@@ -0,0 +1,110 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from src.cache import LRUCache
+from src.sqlite_store import SqliteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extraction_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS extraction_cache_created ON extraction_cache (created_at);
+"""
+
+def normalize_input(user_input: str) -> str:
+    """this function lower cases the message and drops spacing and punctuation that can't change the extraction"""
+    text = re.sub(r"\s+", " ", (user_input or "").lower()).strip()
+    return text.strip(" .!?,;:")
+
+
+class ExtractionCache:
+    """
+    Two tier cache of claude_1 results: an in-memory LRU per worker in front
+    of a sqlite store shared by every worker. claude_1 runs at temperature 0,
+    so its output only depends on the normalized message, the category
+    prompt and the version: extraction mode, prompt or tool schema and
+    vocabulary. Values are stored as json and decoded on every
+    hit, callers get a fresh dict they are free to mutate.
+    """
+    def __init__(self, path: str, memory_size: int=4096, max_rows: int=100000, ttl: float=7 * 24 * 3600):
+        self.path = path
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.memory = LRUCache(memory_size, ttl)
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._connections = SqliteConnections(path, SCHEMA)
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def key(self, user_input: str, category_prompt: str, version: str) -> str:
+        raw = json.dumps([normalize_input(user_input), category_prompt or "", version])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> dict:
+        value = self.memory.get(key)
+        if value is None:
+            try:
+                row = self._db().execute(
+                    "SELECT value FROM extraction_cache WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl)).fetchone()
+            except sqlite3.Error as e:
+                print(f"extraction cache read failed: {e}")
+                row = None
+            with self._lock:
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.disk_hits += 1
+            value = row[0]
+            self.memory.set(key, value)
+        return json.loads(value)
+
+    def set(self, key: str, result: dict) -> None:
+        value = json.dumps(result)
+        self.memory.set(key, value)
+        try:
+            db = self._db()
+            with db:
+                db.execute("INSERT OR REPLACE INTO extraction_cache (key, value, created_at) VALUES (?, ?, ?)",
+                           (key, value, time.time()))
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % 100 == 0
+            if evict:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"extraction cache write failed: {e}")
+
+    def evict(self) -> None:
+        """this function drops expired rows and the oldest rows above max_rows"""
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM extraction_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            db.execute("""DELETE FROM extraction_cache WHERE key IN (
+                SELECT key FROM extraction_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)""", (self.max_rows,))
+
+    def extract(self, extractor, user_input: str, category_prompt: str, all_words: dict, version: str) -> dict:
+        """this function returns the cached extraction or calls the extractor and caches a valid result"""
+        key = self.key(user_input, category_prompt, version)
+        result = self.get(key)
+        if result is None:
+            result = extractor(user_input, category_prompt, all_words)
+            #claude_1 signals a parse failure with the bird_sighting wrapper, it is worth retrying later
+            if isinstance(result, dict) and "bird_sighting" not in result:
+                self.set(key, result)
+        return result
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + self.disk_hits + self.misses
+        return {
+            "memory": memory,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((memory["hits"] + self.disk_hits) / lookups, 4) if lookups else 0,
+        }
@@ -1,58 +1,50 @@
-import sqlite3
 import psycopg2
-import random
+import json
 from src.algo import BirdIdentifier
+from src.cache import LRUCache
+from src.catalog import get_catalog
+from src.policy import QuestionPolicy
+from src import metrics
 # from statistic import ProbabilisticBirdIdentifier
-import os
 
-def create_querry(dbName: str, dic: dict) -> str:
-    query = f"SELECT * FROM {dbName} WHERE 1=1"
-    params = []
+RESULT_CACHE_SIZE = 1024
+#(question, matches) per canonical category state
+_results = LRUCache(RESULT_CACHE_SIZE)
+metrics.register("find_bird_cache", _results.stats)
+
+def canonical_state(dic: dict) -> tuple:
+    """this function turns a category dict into a hashable key, equal for dicts giving the same result"""
+    state = []
     for key, value in dic.items():
-        if not value or key == "new_attribute":
+        if key == "new_attribute":
             continue
-        conditions = []
-        key = f"`{key}`"
-        for item in value:
-            conditions.append(f"{key} LIKE ?")
-            params.append(f"%{item}%")      
-        if conditions:
-            query += f" AND ({' AND '.join(conditions)} OR {key} IS NULL)"
-    return query, params 
+        if not value:
+            value = None
+        elif isinstance(value, str):
+            value = value.lower()
+        elif isinstance(value, list):
+            value = tuple(sorted(set(str(v).lower() for v in value)))
+        else:
+            value = json.dumps(value, sort_keys=True, default=str)
+        state.append((key, value))
+    return tuple(sorted(state, key=lambda item: item[0]))
 
-def fetch_db(querry: str, params: list, isGame: bool=False) -> list:
-    db = sqlite3.connect(os.getenv('POSTGRES_DB'))
-    cursor = db.cursor()
-    if isGame:
-        cursor.execute("select * from birdInfo")
-    else:
-        cursor.execute(querry, params)
-    rows = cursor.fetchall()
-    column_names = [desc[0] for desc in cursor.description]
-    
-    result = [dict(zip(column_names, row)) for row in rows]
-    
-    db.close()
-    if isGame:
-        return random.choice(result)
-    return result
-
-def find_error(bird: dict, dic: dict) -> list:
+def find_error(catalog, row: int, dic: dict) -> list:
     exclusions = []
     
     for key, values in dic.items():
-        if not values:
+        if not values or key == "new_attribute":
             continue
         print(values)
         if isinstance(values, str):
             values = [values]
         print (values)
+        column = catalog.column(key)
+        bird_value = catalog.birds[row].get(key, "") or ""
+        if not bird_value:
+            continue
         for value in values:
-            bird_value = bird.get(key, "") or ""
-            if not bird_value:
-                continue
-            bird_values = bird_value.split(', ')
-            if value not in bird_values:
+            if column.vocab.get(str(value).strip().lower()) not in column.rows[row]:
                 exclusions.append({
                     "category": key,
                     "adjective": value,
@@ -60,24 +52,37 @@ def find_error(bird: dict, dic: dict) -> list:
                 })
     return exclusions
 
-def find_bird(dic: dict, birds_left:int, features: list,  id: int, match_count: int) -> tuple:
-    query, params = create_querry("birdInfo", dic)
-    birds = fetch_db(query, params)
-    all_birds = fetch_db("select * from birdInfo", [])
+def find_question(catalog, dic: dict, features: list, match_count: int, strategy: str, ranking: dict=None) -> tuple:
+    rows = catalog.candidate_rows(dic)
+    birdId = BirdIdentifier(catalog, rows, dic, features, match_count, strategy, ranking)
+    question = birdId.find_best_question()
+    if len(rows) < 2 or not question:
+        return None, birdId.get_best_matches()
+    return question, None
+
+def find_bird(dic: dict, birds_left:int, features: list,  id: int, match_count: int, strategy: str="avg_max",
+              policy: QuestionPolicy=None, ranking: dict=None, catalog=None) -> tuple:
+    catalog = catalog or get_catalog()
     error = None
     #if game
     print(id)
     if id:
+        birds = catalog.filter(dic)
         id_exists = any(d.get("id") == id for d in birds)
         if not id_exists:
-            bird = fetch_db("select * from birdInfo where species_number=?", [id])
-            if isinstance(bird, list) and len(bird) > 0:
-                bird = bird[0]
-            error = find_error(bird, dic)
+            row = catalog.row_of(id)
+            if row is not None:
+                error = find_error(catalog, row, dic)
 
-    birdId = BirdIdentifier(birds, all_birds, dic, features, match_count)
-    question = birdId.find_best_question()
-    if len(birds) < 2 or not question:
-        matches = birdId.get_best_matches()
-        return None, error, matches
-    return question, error, None
\ No newline at end of file
+    if policy and policy.applies_to(catalog.version, features, strategy):
+        question = policy.lookup(dic)
+        if question:
+            return question, error, None
+
+    _results.validate((catalog.version, tuple(features), match_count, strategy, json.dumps(ranking, sort_keys=True)))
+    question, matches = _results.get_or_compute(
+        canonical_state(dic),
+        lambda: find_question(catalog, dic, features, match_count, strategy, ranking))
+    if matches is not None:
+        matches = list(matches)
+    return question, error, matches
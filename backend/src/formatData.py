@@ -1,5 +1,43 @@
 import json
-import os
+import time
+from src.analytics_db import AnalyticsDB
+from src.analytics_log import AnalyticsLog
+from src.writer import BatchWriter, drain_on_exit
+
+#finished conversations, appended one per line
+_log = AnalyticsLog()
+#when set, records are written in batches by a background thread
+_writer = None
+#when set, records are also stored in the indexed analytics tables
+_db = None
+
+def configure_log(settings: dict) -> AnalyticsLog:
+    """this function sets the conversation log options, call it before the first save"""
+    global _log
+    _log = AnalyticsLog(**(settings or {}))
+    return _log
+
+def configure_db(settings: dict) -> AnalyticsDB:
+    """this function adds the sqlite analytics tables next to the log"""
+    global _db
+    _db = AnalyticsDB(**(settings or {}))
+    return _db
+
+def configure_writer(settings: dict) -> BatchWriter:
+    """this function moves the log writes to a background thread, drained when the worker exits"""
+    global _writer
+    _writer = BatchWriter(write_lines, **(settings or {}))
+    drain_on_exit(_writer)
+    return _writer
+
+def write_lines(lines: list) -> None:
+    _log.write_lines(lines)
+    if _db:
+        try:
+            _db.add([json.loads(line) for line in lines])
+        except Exception as e:
+            #the log is the source of truth, the tables can be rebuilt from it
+            print(f"analytics db write failed: {e}")
 
 def calculate_average(conversations):
     total = 0
@@ -27,17 +65,18 @@ def formatData(categories, user_input, current_data, error=None):
         current_data['user_data']['error'] = error
     return current_data
 
-def save_user_data(data, suggestions):
+def save_user_data(data, suggestions, bird_id=None):
+    data['saved_at'] = time.time()
+    data['game_mode'] = bool(bird_id)
+    data['bird_id'] = bird_id
     if data['user_data']['error']:
         data['app_response']['correct'] = False
     if suggestions:
         data['app_response']['suggestions'] = [entry['name'] for entry in suggestions if 'name' in entry]
     data['user_data']['average_message_length'] = calculate_average(data['user_data']['conversation'])
-    if os.path.exists('data/user_data.json'):
-        with open('data/user_data.json', "r") as file:
-            database = json.load(file)
-        database.append(data)
+    #encoded here, the response still holds the same dict
+    line = _log.encode(data)
+    if _writer:
+        _writer.submit(line)
     else:
-        database = [data]
-    with open('data/user_data.json', "w") as file:
-        json.dump(database, file, indent=4)
\ No newline at end of file
+        write_lines([line])
\ No newline at end of file
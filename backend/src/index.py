@@ -0,0 +1,56 @@
+import threading
+from src.columns import tokenize
+
+def iter_bits(mask: int):
+    """this function yields the position of every set bit, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class AttributeIndex:
+    """
+    Inverted index from (feature, token id) to a bitset of birds. Bit i is the
+    i-th bird of the catalog. Birds with a null feature are kept in the
+    column's wildcard mask since a null value matches any description.
+    """
+    def __init__(self, column, size: int):
+        self.column = column
+        self.all = (1 << size) - 1
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def postings(self, feature: str) -> list:
+        postings = self._postings.get(feature)
+        if postings is None:
+            with self._lock:
+                postings = self._postings.get(feature)
+                if postings is None:
+                    column = self.column(feature)
+                    postings = [0] * len(column.tokens)
+                    for i, token_ids in enumerate(column.rows):
+                        for token_id in token_ids:
+                            postings[token_id] |= 1 << i
+                    self._postings[feature] = postings
+        return postings
+
+    def match(self, feature: str, token: str) -> int:
+        """this function returns the birds having the token or no value for the feature"""
+        column = self.column(feature)
+        token_id = column.vocab.get(token)
+        if token_id is None:
+            return column.nulls
+        return self.postings(feature)[token_id] | column.nulls
+
+    def candidates(self, dic: dict) -> int:
+        """this function returns the bitset of birds where every value matches or the column is null"""
+        mask = self.all
+        for feature, value in dic.items():
+            if not value or feature == "new_attribute":
+                continue
+            for token in tokenize(value):
+                mask &= self.match(feature, token)
+                if not mask:
+                    return 0
+        return mask
@@ -0,0 +1,174 @@
+import re
+import threading
+
+#words that carry no information for the identification
+STOP_WORDS = {
+    "a", "an", "the", "i", "im", "ive", "we", "it", "its", "itd", "was", "is", "are", "were", "be", "been",
+    "this", "that", "there", "here", "my", "our", "in", "on", "at", "of", "to", "with", "and", "or", "but",
+    "has", "had", "have", "very", "quite", "really", "pretty", "kind", "sort", "bit", "some", "mostly",
+    "mainly", "just", "also", "maybe", "think", "like", "looked", "looks", "look", "saw", "see", "seen",
+    "spotted", "noticed", "bird", "birds", "one", "colour", "color", "coloured", "colored", "ish",
+    "bright", "dark", "light", "hi", "hello", "hey", "please", "yes", "yeah", "sitting", "sat", "today",
+}
+#words turning the meaning around, the llm handles those
+NEGATIONS = {"not", "no", "never", "without", "isnt", "wasnt", "dont", "didnt", "nor"}
+#answers meaning the user can't answer the prompted question
+UNKNOWN_ANSWERS = {"i dont know", "dont know", "idk", "not sure", "im not sure", "i am not sure", "no idea",
+                   "i didnt see", "didnt see", "i dont remember", "dont remember"}
+SYNONYMS = {"gray": "grey", "greyish": "grey", "grayish": "grey"}
+#body parts giving the category of a nearby ambiguous word, in order of preference
+PARTS = {
+    "beak": ["beak_colour", "beak_shape_1"],
+    "bill": ["beak_colour", "beak_shape_1"],
+    "legs": ["leg_colour"],
+    "leg": ["leg_colour"],
+    "feet": ["feet_colour"],
+    "foot": ["feet_colour"],
+    "tail": ["tail_shape_1", "plumage_colour"],
+}
+for part in ("feathers", "plumage", "wings", "wing", "body", "chest", "breast", "belly", "head", "back",
+             "throat", "neck", "face", "cheeks", "cap", "crown"):
+    PARTS[part] = ["plumage_colour", "pattern_markings"]
+CONTEXT_WINDOW = 3
+
+def words_of(text: str) -> list:
+    """this function splits a text in lower case words, punctuation is kept as a clause break"""
+    text = text.lower().replace("'", "").replace("-", " ")
+    return re.findall(r"[a-z/]+|[,.;!?]", text)
+
+
+class Lexicon:
+    """
+    Local extractor matching a message against the server_setup vocabulary.
+    It returns the same dict shape as claude_1, or None when the message has
+    words it can't place so the caller should ask the llm.
+    """
+    def __init__(self, all_words: dict):
+        self.phrases = {}
+        for feature, words in all_words.items():
+            for word in words:
+                phrase = tuple(w for w in words_of(word) if w.isalpha() or "/" in w)
+                if phrase and feature not in self.phrases.setdefault(phrase, []):
+                    self.phrases[phrase].append(feature)
+        self.categories = set(all_words)
+        self.longest = max((len(phrase) for phrase in self.phrases), default=1)
+        self.hits = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def normalize(self, word: str) -> str:
+        """this function maps plurals, '-ish' suffixes and synonyms to a vocabulary word when one exists"""
+        word = SYNONYMS.get(word, word)
+        if (word,) in self.phrases:
+            return word
+        candidates = [word + "s"]
+        if word.endswith("ish"):
+            candidates += [word[:-3], word[:-4], word[:-3] + "e"]
+        if word.endswith("es"):
+            candidates.append(word[:-2])
+        if word.endswith("s"):
+            candidates.append(word[:-1])
+        for candidate in candidates:
+            if (candidate,) in self.phrases:
+                return candidate
+        return word
+
+    def tokens(self, user_input: str) -> list:
+        """this function returns (kind, value, clause) items, longest vocabulary phrases first"""
+        words = []
+        clause = 0
+        for word in words_of(user_input):
+            if not word[0].isalpha() and "/" not in word:
+                clause += 1
+                continue
+            words.append((self.normalize(word), clause))
+
+        items = []
+        i = 0
+        while i < len(words):
+            for size in range(min(self.longest, len(words) - i), 0, -1):
+                phrase = tuple(word for word, _ in words[i:i + size])
+                if phrase in self.phrases and len({c for _, c in words[i:i + size]}) == 1:
+                    items.append(("term", " ".join(phrase), words[i][1]))
+                    i += size
+                    break
+            else:
+                word, clause = words[i]
+                if word in PARTS:
+                    items.append(("part", word, clause))
+                elif word in STOP_WORDS:
+                    items.append(("stop", word, clause))
+                else:
+                    items.append(("unknown", word, clause))
+                i += 1
+        return items
+
+    def context(self, items: list, position: int) -> list:
+        """this function returns the categories of the closest body part in the same clause, after then before,
+        not looking past another term or the word bird, which belong to that word"""
+        clause = items[position][2]
+        after = items[position + 1:position + 1 + CONTEXT_WINDOW]
+        before = reversed(items[max(0, position - CONTEXT_WINDOW):position])
+        for neighbours in (after, before):
+            for kind, value, item_clause in neighbours:
+                if item_clause != clause or kind == "term" or value in ("bird", "birds"):
+                    break
+                if kind == "part":
+                    return PARTS[value]
+        return []
+
+    def extract(self, user_input: str, category_prompt: str=None) -> dict:
+        """this function returns the categories found in the message, None when the llm is needed"""
+        result = self._extract(user_input, category_prompt, False)
+        with self._lock:
+            if result is None:
+                self.fallbacks += 1
+            else:
+                self.hits += 1
+        return result
+
+    def stats(self) -> dict:
+        total = self.hits + self.fallbacks
+        return {"hits": self.hits, "llm_fallbacks": self.fallbacks,
+                "hit_rate": round(self.hits / total, 4) if total else 0}
+
+    def extract_known(self, user_input: str, category_prompt: str=None) -> dict:
+        """this function returns only the categories it is sure about, used when the llm is not available"""
+        return self._extract(user_input, category_prompt, True) or {}
+
+    def _extract(self, user_input: str, category_prompt: str, partial: bool) -> dict:
+        words = words_of(user_input or "")
+        if " ".join(w for w in words if w.isalpha()) in UNKNOWN_ANSWERS:
+            return {}
+        if any(word in NEGATIONS for word in words):
+            return None
+
+        items = self.tokens(user_input)
+        if not partial and any(kind == "unknown" for kind, _, _ in items):
+            return None
+
+        found = {}
+        for position, (kind, value, _) in enumerate(items):
+            if kind != "term":
+                continue
+            features = self.phrases[tuple(value.split(" "))]
+            feature = None
+            if category_prompt in features:
+                feature = category_prompt
+            elif category_prompt in self.categories:
+                #an answer to another category's question is only placed by a body part next to it
+                feature = next((f for f in self.context(items, position) if f in features), None)
+            elif len(features) == 1:
+                feature = features[0]
+            else:
+                feature = next((f for f in self.context(items, position) if f in features), None)
+                if feature is None and "plumage_colour" in features:
+                    feature = "plumage_colour"
+            if feature is None:
+                if partial:
+                    continue
+                return None
+            values = found.setdefault(feature, [])
+            if value not in values:
+                values.append(value)
+        return {feature: ", ".join(values) for feature, values in found.items()}
@@ -0,0 +1,94 @@
+import os
+import threading
+import anthropic
+import httpx
+
+DEFAULT_SETTINGS = {
+    "timeout": 30.0,
+    "connect_timeout": 5.0,
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 60.0,
+    "max_retries": 2,
+    "base_url": None,
+}
+
+_settings = dict(DEFAULT_SETTINGS)
+_lock = threading.Lock()
+# (pid, client): a forked worker must not reuse its parent's connections
+_client = None
+
+def configure(settings: dict) -> None:
+    """this function sets the client options, call it before the first llm call"""
+    global _client
+    with _lock:
+        _settings.update(settings or {})
+        _client = None
+
+def _client_options(http_client_class) -> dict:
+    #the sdk sends its own timeout with every request, so it is set on the client and not only on httpx
+    timeout = httpx.Timeout(_settings["timeout"], connect=_settings["connect_timeout"])
+    http_client = http_client_class(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=_settings["max_connections"],
+            max_keepalive_connections=_settings["max_keepalive_connections"],
+            keepalive_expiry=_settings["keepalive_expiry"],
+        ),
+    )
+    #base_url None keeps the sdk default (ANTHROPIC_BASE_URL or the public api), set it to use a local stand-in
+    return dict(http_client=http_client, timeout=timeout, max_retries=_settings["max_retries"],
+                base_url=_settings["base_url"])
+
+def create_client() -> anthropic.Anthropic:
+    return anthropic.Anthropic(**_client_options(anthropic.DefaultHttpxClient))
+
+def create_async_client() -> anthropic.AsyncAnthropic:
+    """this function returns a new async client, it must be used from a single event loop"""
+    return anthropic.AsyncAnthropic(**_client_options(anthropic.DefaultAsyncHttpxClient))
+
+def get_client() -> anthropic.Anthropic:
+    """this function returns the worker's shared anthropic client, created on first use"""
+    global _client
+    client = _client
+    if client and client[0] == os.getpid():
+        return client[1]
+    with _lock:
+        if not _client or _client[0] != os.getpid():
+            _client = (os.getpid(), create_client())
+        return _client[1]
+
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+_usage = {}
+_parse = {}
+
+def record_usage(name: str, usage) -> dict:
+    """this function adds the token counts of one call to the per prompt totals and returns them"""
+    call = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+    call["cache_hit"] = call["cache_read_input_tokens"] > 0
+    with _lock:
+        totals = _usage.setdefault(name, dict.fromkeys(USAGE_FIELDS + ("calls", "cache_hits"), 0))
+        for field in USAGE_FIELDS:
+            totals[field] += call[field]
+        totals["calls"] += 1
+        totals["cache_hits"] += call["cache_hit"]
+    return call
+
+def record_parse(name: str, seconds: float) -> None:
+    """this function adds the time spent parsing one answer to the per prompt totals"""
+    with _lock:
+        totals = _parse.setdefault(name, {"parses": 0, "parse_seconds": 0.0})
+        totals["parses"] += 1
+        totals["parse_seconds"] += seconds
+
+def usage_stats() -> dict:
+    with _lock:
+        stats = {name: dict(totals) for name, totals in _usage.items()}
+        for name, totals in _parse.items():
+            stats.setdefault(name, {})["avg_parse_ms"] = round(1000 * totals["parse_seconds"] / totals["parses"], 4)
+    #compares the output size of the extraction modes
+    for totals in stats.values():
+        if totals.get("calls"):
+            totals["avg_output_tokens"] = round(totals["output_tokens"] / totals["calls"], 2)
+    return stats
@@ -0,0 +1,8 @@
+_providers = {}
+
+def register(name: str, provider) -> None:
+    """this function adds a callable returning a json serializable dict to /metrics"""
+    _providers[name] = provider
+
+def snapshot() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
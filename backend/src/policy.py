@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+
+class QuestionPolicy:
+    """
+    Precompiled next-question tree built by utils/build_policy.py. A node is
+    [question] or [question, {answer: child}], where an empty answer stands
+    for a question the user could not answer. The tree is only valid for the
+    catalog version, features and strategy it was built with.
+    """
+    def __init__(self, data: dict):
+        self.version = data["version"]
+        self.features = list(data["features"])
+        self.strategy = data["strategy"]
+        self.depth = data["depth"]
+        self.tree = data["tree"]
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def applies_to(self, version: str, features: list, strategy: str) -> bool:
+        return self.version == version and self.features == list(features) and self.strategy == strategy
+
+    def _walk(self, dic: dict) -> str:
+        remaining = {}
+        for key, value in dic.items():
+            if key == "new_attribute":
+                continue
+            if key not in self.features:
+                if value:
+                    return None
+                continue
+            if isinstance(value, list):
+                value = value[0] if len(value) == 1 else ", ".join(value)
+            value = str(value).strip().lower() if value else ""
+            if "," in value:
+                return None
+            remaining[key] = value
+
+        node = self.tree
+        while remaining:
+            question = node[0]
+            if question is None or len(node) < 2 or question not in remaining:
+                return None
+            node = node[1].get(remaining.pop(question))
+            if node is None:
+                return None
+        return node[0]
+
+    def lookup(self, dic: dict) -> str:
+        """this function returns the precomputed question for this state or None when it is not in the tree"""
+        question = self._walk(dic)
+        with self._lock:
+            if question:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return question
+
+    def stats(self) -> dict:
+        return {"version": self.version, "depth": self.depth, "hits": self.hits, "misses": self.misses}
+
+
+def load_policy(path: str) -> QuestionPolicy:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return QuestionPolicy(json.load(file))
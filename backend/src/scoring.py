@@ -0,0 +1,127 @@
+import numpy as np
+from src.columns import tokenize
+
+def query_tokens(values) -> set:
+    """this function lower cases the described values the same way the match percentage always did"""
+    if isinstance(values, list):
+        return set(str(v).lower() for v in values)
+    return {str(values).lower()}
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return the indices of the k best scores, best first. Ties keep catalog
+    order, exactly like a stable sort of every bird would.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(-scores, kind='stable')
+    kth = scores[np.argpartition(scores, n - k)[n - k]]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    selected = np.concatenate([above, ties])
+    return selected[np.argsort(-scores[selected], kind='stable')]
+
+
+class MatchMatrix:
+    """
+    Birds x (feature, token) boolean matrix built once per catalog from its
+    interned columns; a feature's tokens are contiguous matrix columns. A null
+    feature counts as a match, like in the original per bird scoring.
+    """
+    def __init__(self, columns: list, size: int):
+        self.features = [column.name for column in columns]
+        self._feature_ids = {feature: i for i, feature in enumerate(self.features)}
+        self._columns = columns
+        self.offsets = []
+        self.feature_columns = {}
+        width = 0
+        for column in columns:
+            self.offsets.append(width)
+            self.feature_columns[column.name] = np.arange(width, width + len(column.tokens))
+            width += len(column.tokens)
+
+        self.matrix = np.zeros((size, width), dtype=np.float32)
+        self.nulls = np.zeros((size, len(columns)), dtype=bool)
+        for f, column in enumerate(columns):
+            for row, token_ids in enumerate(column.rows):
+                for token_id in token_ids:
+                    self.matrix[row, self.offsets[f] + token_id] = 1
+                self.nulls[row, f] = column.is_null(row)
+
+    def column(self, feature: str, token: str) -> int:
+        """this function returns the matrix column of a token, None if the token is unknown"""
+        f = self._feature_ids.get(feature)
+        if f is None:
+            return None
+        token_id = self._columns[f].vocab.get(token)
+        if token_id is None:
+            return None
+        return self.offsets[f] + token_id
+
+    def values(self, rows: list, feature: str) -> list:
+        """this function returns the tokens of a feature present among these rows"""
+        f = self._feature_ids[feature]
+        present = self.matrix[np.ix_(rows, self.feature_columns[feature])].any(axis=0)
+        return [self._columns[f].tokens[i] for i in np.flatnonzero(present)]
+
+    def percentages(self, dic: dict) -> np.ndarray:
+        """this function computes the match percentage of every bird in one pass"""
+        described = [(feature, values) for feature, values in dic.items() if feature in self._feature_ids]
+        if not described:
+            return np.zeros(len(self.matrix))
+
+        query = np.zeros((self.matrix.shape[1], len(described)), dtype=np.float32)
+        always = np.zeros(len(described), dtype=bool)
+        for q, (feature, values) in enumerate(described):
+            if not values:
+                always[q] = True
+                continue
+            for token in query_tokens(values):
+                column = self.column(feature, token)
+                if column is not None:
+                    query[column, q] = 1
+
+        feature_ids = [self._feature_ids[feature] for feature, _ in described]
+        hits = (self.matrix @ query > 0) | self.nulls[:, feature_ids] | always
+        return (hits.sum(axis=1) / len(described)) * 100
+
+    def weighted_scores(self, dic: dict, weights: dict, null_credit: float=0.5, ordinal: dict=None,
+                        ordinal_step: float=0.25) -> np.ndarray:
+        """
+        Weighted partial credit score between 0 and 1 for every bird. A described
+        feature scores the share of described values the bird has, an ordinal
+        feature (like size) loses ordinal_step per step of distance, and a bird
+        without a value gets null_credit instead of a full match.
+        """
+        ordinal = ordinal or {}
+        total = np.zeros(len(self.matrix))
+        weight_sum = 0
+        for feature, values in dic.items():
+            f = self._feature_ids.get(feature)
+            weight = weights.get(feature, 0)
+            tokens = tokenize(values) if values and not isinstance(values, dict) else []
+            if f is None or not weight or not tokens:
+                continue
+            vocab = self._columns[f].vocab
+            block = self.matrix[:, self.feature_columns[feature]]
+            order = ordinal.get(feature, [])
+            positions = [order.index(token) for token in tokens if token in order]
+            if positions:
+                token_positions = np.array([order.index(t) if t in order else np.inf for t in self._columns[f].tokens],
+                                           dtype=float)
+                distance = np.abs(token_positions[:, None] - np.array(positions, dtype=float)[None, :]).min(axis=1)
+                closest = np.where(block > 0, distance, np.inf).min(axis=1, initial=np.inf)
+                score = np.clip(1 - ordinal_step * closest, 0, 1)
+            else:
+                query = np.zeros(block.shape[1], dtype=np.float32)
+                for token in tokens:
+                    if token in vocab:
+                        query[vocab[token]] = 1
+                score = (block @ query) / len(tokens)
+            total += weight * np.where(self.nulls[:, f], null_credit, score)
+            weight_sum += weight
+        if not weight_sum:
+            return total
+        return total / weight_sum
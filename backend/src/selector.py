@@ -0,0 +1,54 @@
+import numpy as np
+from src.scoring import MatchMatrix
+
+STRATEGIES = ("information_gain", "expected_remaining", "avg_max")
+
+class QuestionSelector:
+    """
+    Picks the feature to ask about next. Every (feature, value) occurrence over
+    the candidate birds is counted in one pass over the match matrix; a bird
+    without a value for a feature stays in every group of that feature.
+
+    strategies (lower score wins):
+    - information_gain: expected log2 size of the group left after the answer
+    - expected_remaining: expected size of the group left after the answer
+    - avg_max: average group size + largest group size (the original score)
+    """
+    def __init__(self, scorer: MatchMatrix, strategy: str="avg_max"):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown question strategy: {strategy}")
+        self.scorer = scorer
+        self.strategy = strategy
+
+    def score(self, counts: np.ndarray, nulls: int, size: int) -> float:
+        """this function scores one feature from its value counts, None if it can't split"""
+        counts = counts[counts > 0]
+        if not len(counts):
+            return None
+        groups = counts + nulls
+        if groups.min() >= size:
+            return None
+        if self.strategy == "avg_max":
+            return groups.mean() + groups.max()
+        weights = counts / counts.sum()
+        if self.strategy == "expected_remaining":
+            return float(weights @ groups)
+        return float(weights @ np.log2(groups))
+
+    def best_feature(self, rows: list, used_features: list) -> str:
+        """this function finds the best feature to filter on"""
+        if len(rows) < 2:
+            return None
+        counts = self.scorer.matrix[rows].sum(axis=0)
+        nulls = self.scorer.nulls[rows].sum(axis=0)
+
+        best_score = float('inf')
+        best_feature = None
+        for f, feature in enumerate(self.scorer.features):
+            if feature in used_features:
+                continue
+            score = self.score(counts[self.scorer.feature_columns[feature]], nulls[f], len(rows))
+            if score is not None and score < best_score:
+                best_score = score
+                best_feature = feature
+        return best_feature
@@ -0,0 +1,27 @@
+import os
+import sqlite3
+import threading
+
+class SqliteConnections:
+    """
+    One sqlite connection per thread and per process for a store shared by
+    every gunicorn worker. A connection is never reused after a fork, and
+    every store gets the same pragmas: WAL so readers don't block the
+    writer, synchronous NORMAL which is safe in WAL mode.
+    """
+    def __init__(self, path: str, schema: str, timeout: float=5):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(self.schema)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
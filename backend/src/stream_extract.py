@@ -0,0 +1,119 @@
+import time
+import xml.etree.ElementTree as ET
+from src.claude_1a import extraction_request, restrict_to_vocabulary
+from src.llm import get_client, record_usage, record_parse
+
+ROOT = "bird_sighting"
+#the model stops here instead of writing the closing tag and whatever trails it
+STOP_SEQUENCE = f"</{ROOT}>"
+
+def element_value(element: ET.Element):
+    """this function converts an element the way xmltodict does: text, None when empty, dict for children"""
+    if not len(element):
+        return (element.text or "").strip() or None
+    value = {}
+    for child in element:
+        add_value(value, child.tag, element_value(child))
+    return value
+
+def add_value(values: dict, key: str, value) -> None:
+    #a repeated tag becomes a list, like xmltodict
+    if key not in values:
+        values[key] = value
+    elif isinstance(values[key], list):
+        values[key].append(value)
+    else:
+        values[key] = [values[key], value]
+
+
+class SightingStreamParser:
+    """
+    Incremental parser of the claude_1 answer. Text is fed as it streams in
+    and every child of <bird_sighting> is returned as soon as it closes. Text
+    before the root is skipped, and malformed xml ends the parse keeping the
+    elements already closed in features; result() then reports a failure
+    like claude_1 does, so a broken answer is neither cached nor trusted.
+    """
+    def __init__(self):
+        self.features = {}
+        self.broken = False
+        self.parse_seconds = 0.0
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._started = False
+        self._closed = False
+        self._pending = ""
+        self._depth = 0
+
+    def feed(self, text: str) -> list:
+        """this function parses a chunk and returns the (feature, value) elements it closed"""
+        if self.broken or self._closed:
+            return []
+        if not self._started:
+            self._pending += text
+            start = self._pending.find(f"<{ROOT}")
+            if start < 0:
+                #keep a possible partial tag for the next chunk
+                self._pending = self._pending[-len(ROOT) - 1:]
+                return []
+            text = self._pending[start:]
+            self._started = True
+            self._pending = ""
+        start = time.perf_counter()
+        try:
+            self._parser.feed(text)
+            return self._read_events()
+        except ET.ParseError:
+            self.broken = True
+            return []
+        finally:
+            self.parse_seconds += time.perf_counter() - start
+
+    def _read_events(self) -> list:
+        closed = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                continue
+            self._depth -= 1
+            if self._depth == 0:
+                self._closed = True
+            elif self._depth == 1:
+                value = element_value(element)
+                add_value(self.features, element.tag, value)
+                closed.append((element.tag, value))
+        return closed
+
+    def close(self) -> list:
+        """this function ends the stream, closing the root the stop sequence cut off"""
+        if not self._started or self._closed:
+            return []
+        return self.feed(STOP_SEQUENCE)
+
+    def result(self) -> dict:
+        """this function returns the categories, or claude_1's parse failure marker unless the whole root was read"""
+        if self.broken or not self._closed:
+            return {ROOT: {}}
+        return self.features
+
+
+def streaming_request(user_input: str, category_prompt: str, all_words: dict) -> dict:
+    """this function returns the messages.stream arguments of an extraction"""
+    request = extraction_request(user_input, category_prompt, all_words)
+    request["stop_sequences"] = [STOP_SEQUENCE]
+    return request
+
+def claude_1_stream(user_input: str, category_prompt: str, all_words: dict, on_feature=None) -> dict:
+    """this function streams claude_1, calling on_feature(feature, value) as each category closes"""
+    parser = SightingStreamParser()
+    with get_client().messages.stream(**streaming_request(user_input, category_prompt, all_words)) as stream:
+        for text in stream.text_stream:
+            for feature, value in parser.feed(text):
+                if on_feature:
+                    on_feature(feature, value)
+        message = stream.get_final_message()
+    for feature, value in parser.close():
+        if on_feature:
+            on_feature(feature, value)
+    record_usage('claude_1', message.usage)
+    record_parse('claude_1', parser.parse_seconds)
+    return restrict_to_vocabulary(parser.result(), all_words, category_prompt)
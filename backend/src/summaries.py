@@ -0,0 +1,167 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from src.cache import LRUCache
+from src.filter import canonical_state
+from src.sqlite_store import SqliteConnections
+
+#value is null while a worker is generating the summary
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, value TEXT, created_at REAL NOT NULL);
+"""
+
+class SummaryService:
+    """
+    Generates claude_summary off the request path. A summary is started on a
+    background pool as soon as the categories are known and stored by
+    canonical category state in a sqlite table shared by every gunicorn
+    worker, with an in-memory LRU in front. The first worker to claim a state
+    makes the llm call; the others, and /summary polls landing on them, read
+    the row once it is filled. A claim older than claim_timeout is taken over.
+    """
+    def __init__(self, summarize, path: str="data/summaries.db", workers: int=2, cache_size: int=1024,
+                 ttl: float=7 * 24 * 3600, claim_timeout: float=60.0):
+        self.summarize = summarize
+        self.path = path
+        self.workers = workers
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self.cache = LRUCache(cache_size, ttl)
+        self.generated = 0
+        self.errors = 0
+        self._writes = 0
+        self._pending = {}
+        self._pool = None
+        self._pid = None
+        self._connections = SqliteConnections(path, SCHEMA)
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def key(self, dic: dict) -> str:
+        return hashlib.sha256(json.dumps(canonical_state(dic)).encode()).hexdigest()
+
+    def _get_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        #a forked worker can't use its parent's threads
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summary")
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._pool
+
+    def _read(self, key: str) -> str:
+        summary = self.cache.get(key)
+        if summary is None:
+            try:
+                row = self._db().execute(
+                    "SELECT value FROM summaries WHERE key = ? AND value IS NOT NULL AND created_at >= ?",
+                    (key, time.time() - self.ttl)).fetchone()
+            except sqlite3.Error as e:
+                print(f"summary store read failed: {e}")
+                row = None
+            if row is not None:
+                summary = row[0]
+                self.cache.set(key, summary)
+        return summary
+
+    def _claim(self, key: str) -> bool:
+        """this function marks the summary as being generated here, False when another worker already is"""
+        now = time.time()
+        try:
+            db = self._db()
+            with db:
+                cursor = db.execute(
+                    "INSERT INTO summaries (key, value, created_at) VALUES (?, NULL, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = NULL, created_at = excluded.created_at "
+                    "WHERE (summaries.value IS NULL AND summaries.created_at < ?) OR summaries.created_at < ?",
+                    (key, now, now - self.claim_timeout, now - self.ttl))
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            #without the store every worker generates its own
+            print(f"summary store claim failed: {e}")
+            return True
+
+    def _store(self, key: str, summary: str) -> None:
+        self.cache.set(key, summary)
+        try:
+            db = self._db()
+            with db:
+                db.execute("INSERT OR REPLACE INTO summaries (key, value, created_at) VALUES (?, ?, ?)",
+                           (key, summary, time.time()))
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % 100 == 0
+            if evict:
+                with db:
+                    db.execute("DELETE FROM summaries WHERE created_at < ?", (time.time() - self.ttl,))
+        except sqlite3.Error as e:
+            print(f"summary store write failed: {e}")
+
+    def _release(self, key: str) -> None:
+        #a failed claim is dropped so the next request retries instead of waiting for claim_timeout
+        try:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM summaries WHERE key = ? AND value IS NULL", (key,))
+        except sqlite3.Error as e:
+            print(f"summary store release failed: {e}")
+
+    def _run(self, key: str, dic: dict) -> str:
+        try:
+            summary = self.summarize(dic) or ""
+            self._store(key, summary)
+            self.generated += 1
+            return summary
+        except Exception as e:
+            self.errors += 1
+            print(f"summary failed: {e}")
+            self._release(key)
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def start(self, dic: dict) -> concurrent.futures.Future:
+        """this function starts the summary of these categories, None if it is stored or running on another worker"""
+        key = self.key(dic)
+        if self._read(key) is not None:
+            return None
+        with self._lock:
+            pool = self._get_pool()
+            future = self._pending.get(key)
+            if future is None:
+                if not self._claim(key):
+                    return None
+                #claude_summary edits its argument
+                future = pool.submit(self._run, key, {k: v for k, v in dic.items() if k != "new_attribute"})
+                self._pending[key] = future
+            return future
+
+    def get(self, dic: dict, wait: float=0) -> str:
+        """this function returns the summary, starting it on a miss and waiting up to wait seconds, None if not ready"""
+        key = self.key(dic)
+        summary = self._read(key)
+        if summary is not None:
+            return summary
+        deadline = time.monotonic() + wait
+        future = self.start(dic)
+        if future is not None:
+            try:
+                return future.result(wait)
+            except concurrent.futures.TimeoutError:
+                return None
+        #stored meanwhile, or generated by another worker: poll the shared store
+        while True:
+            summary = self._read(key)
+            remaining = deadline - time.monotonic()
+            if summary is not None or remaining <= 0:
+                return summary
+            time.sleep(min(0.2, remaining))
+
+    def stats(self) -> dict:
+        return dict(self.cache.stats(), pending=len(self._pending), generated=self.generated, errors=self.errors)
@@ -0,0 +1,86 @@
+import time
+from src.claude_1a import build_user_prompt
+from src.llm import get_client, record_usage, record_parse
+from src.utils import vocabulary_hash
+
+TOOL_NAME = "record_bird_sighting"
+#the answer is a few enum values, a larger budget only pays for runaway output
+TOOL_MAX_TOKENS = 200
+
+SYSTEM_PROMPT = f"""You are a bird expert classifying a bird description into categories with our specific wording.
+The user input is given in <user_input> tags in the user message. Call {TOOL_NAME} once:
+-only fill the categories the description gives, using the closest allowed values
+-leave out the categories you have no data for, and anything irrelevant to bird identification
+-put relevant characteristics matching no category in new_attribute, as short name: value pairs"""
+
+#tool definition per vocabulary hash
+_tools = {}
+
+def extraction_tool(all_words: dict) -> dict:
+    """this function returns the tool whose input schema only allows the vocabulary of every key feature"""
+    vocab_hash = vocabulary_hash(all_words)
+    tool = _tools.get(vocab_hash)
+    if tool is None:
+        properties = {
+            feature: {"type": "array", "items": {"type": "string", "enum": list(words)}, "uniqueItems": True}
+            for feature, words in all_words.items()
+        }
+        properties["new_attribute"] = {"type": "object", "additionalProperties": {"type": "string"}}
+        tool = {
+            "name": TOOL_NAME,
+            "description": "Record the categories of a bird sighting.",
+            "input_schema": {"type": "object", "properties": properties, "additionalProperties": False},
+            #tools come before the system prompt, caching here covers both
+            "cache_control": {"type": "ephemeral"},
+        }
+        _tools[vocab_hash] = tool
+    return tool
+
+def tool_request(user_input: str, category_prompt: str, all_words: dict) -> dict:
+    """this function returns the messages.create arguments of a tool extraction"""
+    return dict(
+        model="claude-3-5-sonnet-20241022",
+        max_tokens=TOOL_MAX_TOKENS,
+        temperature=0,
+        system=[{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}],
+        tools=[extraction_tool(all_words)],
+        tool_choice={"type": "tool", "name": TOOL_NAME},
+        messages=[{
+            "role": "user",
+            "content": [{"type": "text", "text": build_user_prompt(user_input, category_prompt)}]
+        }]
+    )
+
+def validate_sighting(data, all_words: dict) -> dict:
+    """this function keeps the known values of every feature, joined like the xml answers"""
+    if not isinstance(data, dict):
+        return {}
+    features = {}
+    for feature, words in all_words.items():
+        values = data.get(feature)
+        if isinstance(values, str):
+            values = values.split(",")
+        if not isinstance(values, list):
+            continue
+        allowed = set(words)
+        values = [value.strip() for value in values if isinstance(value, str) and value.strip() in allowed]
+        if values:
+            features[feature] = ", ".join(dict.fromkeys(values))
+    new_attribute = data.get("new_attribute")
+    if isinstance(new_attribute, dict):
+        new_attribute = {str(key): str(value) for key, value in new_attribute.items() if value}
+        if new_attribute:
+            features["new_attribute"] = new_attribute
+    return features
+
+def parse_tool_extraction(message, all_words: dict) -> dict:
+    record_usage('claude_1_tool', message.usage)
+    start = time.perf_counter()
+    data = next((block.input for block in message.content if getattr(block, "type", None) == "tool_use"), None)
+    features = validate_sighting(data, all_words)
+    record_parse('claude_1_tool', time.perf_counter() - start)
+    return features
+
+def claude_1_tool(user_input: str, category_prompt: str, all_words: dict) -> dict:
+    message = get_client().messages.create(**tool_request(user_input, category_prompt, all_words))
+    return parse_tool_extraction(message, all_words)
@@ -1,7 +1,6 @@
-import sqlite3
-import os
-import numpy as np
+import hashlib
 import json
+from src.catalog import get_catalog
 
 def update_and_join(dict1: dict, dict2: dict) -> dict:
     for key, value in dict2.items():
@@ -21,26 +20,21 @@ def update_and_join(dict1: dict, dict2: dict) -> dict:
 
 
 def server_setup(key_features: list) -> dict:
-    query = f"SELECT {', '.join(key_features)} FROM birdInfo"
-    db = sqlite3.connect(os.getenv('POSTGRES_DB'))
-    cursor = db.cursor()
-    cursor.execute(query)
-    results = cursor.fetchall()
-
-    results = np.array([list(row) for row in results])
+    catalog = get_catalog()
     all_words = {}
-    for i, feature in enumerate(key_features):
-        all_words[feature] = []
-        rows = results[:, i]
-        for row in rows:
-            if not row:
-                continue
-            adjectives = row.split(', ')
-            for word in adjectives:
-                if not word in all_words[feature]:
-                    all_words[feature].append(word)
-    cursor.close()
-    db.close()
+    for feature in key_features:
+        all_words[feature] = list(catalog.column(feature).tokens)
     # with open('words.json', "w") as file:
     #     json.dump(all_words, file, indent=4)
-    return all_words
\ No newline at end of file
+    return all_words
+
+#hash per vocabulary object, a vocabulary is never edited once loaded so it is hashed once
+_vocabulary_hashes = {}
+
+def vocabulary_hash(all_words: dict) -> str:
+    cached = _vocabulary_hashes.get(id(all_words))
+    #the vocabulary is kept in the entry so its id can't be reused by another dict
+    if cached is None or cached[0] is not all_words:
+        cached = (all_words, hashlib.sha1(json.dumps(all_words, sort_keys=True).encode()).hexdigest()[:12])
+        _vocabulary_hashes[id(all_words)] = cached
+    return cached[1]
\ No newline at end of file
@@ -0,0 +1,112 @@
+import atexit
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+class BatchWriter:
+    """
+    Bounded queue in front of a slow sink. Request threads only enqueue; a
+    writer thread hands the sink batches of up to batch_size items, at least
+    every flush_interval seconds. When the queue is full the item is dropped
+    and counted instead of blocking the request.
+    """
+    def __init__(self, sink, max_queue: int=10000, batch_size: int=100, flush_interval: float=1.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        #a forked worker doesn't inherit the writer thread
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, item) -> bool:
+        """this function queues an item for the writer thread, False if it was dropped"""
+        if self._closed:
+            self.dropped += 1
+            return False
+        if self._thread is None or self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: list) -> None:
+        try:
+            self.sink(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"batch writer failed to write {len(batch)} items: {e}")
+
+    def close(self, timeout: float=10.0) -> None:
+        """this function writes what is queued and stops the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+_STOP = object()
+
+def drain_on_exit(writer: BatchWriter) -> None:
+    """this function drains the writer when the process exits, SIGTERM included"""
+    atexit.register(writer.close)
+    #gunicorn workers already exit cleanly on SIGTERM, a plain python process would die without running atexit
+    if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
@@ -0,0 +1,62 @@
+# end to end load test of POST /birds, run it against a backend pointed at utils/mock_anthropic.py
+# usage (from backend/): python -m utils.bench_birds --url http://localhost:5000 --requests 500 --concurrency 16
+# add --unique to measure the llm path, the fixed messages are mostly answered by the lexicon and the extraction cache
+import argparse
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MESSAGES = [
+    "a small brown bird", "it had a red chest", "small with a black beak and pink legs",
+    "it was in my garden and singing loudly", "a large black bird", "brown and grey",
+    "a tiny bird with a yellow breast", "it had a long tail", "extra small", "in the woods",
+]
+
+PLACES = ["garden", "park", "woods", "river", "field", "coast", "hedge", "feeder", "roof", "marsh"]
+
+def unique_message(number: int) -> str:
+    """this function returns a message no earlier request sent, with a word the lexicon doesn't know"""
+    return f"{random.choice(MESSAGES)}, {random.choice(MESSAGES)}, seen near the {random.choice(PLACES)} at spot{number}"
+
+def post(url: str, payload: dict) -> tuple:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    start = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.monotonic() - start
+
+def percentile(samples: list, p: float) -> float:
+    return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="load test POST /birds")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--unique", action="store_true", help="send varied messages that miss the lexicon and the extraction cache")
+    args = parser.parse_args()
+
+    #a per run offset so a second run doesn't hit the cache the first one filled
+    offset = random.randrange(10 ** 9)
+    payloads = [{"birdId": None, "message": unique_message(offset + i) if args.unique else random.choice(MESSAGES),
+                 "categoryPrompt": None, "categories": {}, "user_data": None} for i in range(args.requests)]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda payload: post(f"{args.url}/birds", payload), payloads))
+    elapsed = time.monotonic() - start
+
+    latencies = sorted(latency for status, latency in results if status == 200)
+    errors = len(results) - len(latencies)
+    print(f"{len(results)} requests in {elapsed:.2f}s: {len(results) / elapsed:.1f} req/s, {errors} errors")
+    for p in (0.5, 0.9, 0.99):
+        print(f"p{int(p * 100)}: {percentile(latencies, p) * 1000:.0f} ms")
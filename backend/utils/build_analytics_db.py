@@ -0,0 +1,31 @@
+# rebuilds the sqlite analytics tables from the conversation log (and the older user_data.json)
+# usage (from backend/, with the backend stopped): python -m utils.build_analytics_db
+import json
+import os
+from src.analytics_db import AnalyticsDB
+from src.analytics_log import iter_records
+
+BATCH_SIZE = 500
+
+if __name__ == '__main__':
+    with open('config.json') as config_file:
+        config = json.load(config_file)
+    directory = (config.get("user_data_log") or {}).get("directory", "data/user_data")
+    path = (config.get("analytics_db") or {}).get("path", "data/analytics.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    db = AnalyticsDB(path)
+    batch = []
+    count = 0
+    counts = {}
+    for record in iter_records(directory, counts=counts):
+        batch.append(record)
+        if len(batch) == BATCH_SIZE:
+            db.add(batch)
+            count += len(batch)
+            batch = []
+    db.add(batch)
+    count += len(batch)
+    print(f"stored {count} conversations in {path}, skipped {counts.get('skipped', 0)} undecodable log lines")
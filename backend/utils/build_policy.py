@@ -0,0 +1,46 @@
+# builds the question policy tree loaded by the server at startup
+# usage (from backend/): python -m utils.build_policy [depth]
+import json
+import os
+import sys
+from dotenv import load_dotenv
+from src.catalog import get_catalog
+from src.filter import find_question
+
+def build_node(catalog, state: dict, config: dict, strategy: str, depth: int) -> list:
+    question, _ = find_question(catalog, state, config["key_features"], config["match_count"], strategy)
+    if question is None or depth == 0:
+        return [question]
+
+    rows = catalog.candidate_rows(state)
+    answers = catalog.match_matrix(config["key_features"]).values(rows, question)
+    children = {}
+    for answer in sorted(answers):
+        children[answer] = build_node(catalog, {**state, question: answer}, config, strategy, depth - 1)
+    children[""] = build_node(catalog, {**state, question: None}, config, strategy, depth - 1)
+    return [question, children]
+
+def count_nodes(node: list) -> int:
+    if len(node) < 2:
+        return 1
+    return 1 + sum(count_nodes(child) for child in node[1].values())
+
+if __name__ == '__main__':
+    load_dotenv()
+    with open('config.json') as config_file:
+        config = json.load(config_file)
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else config.get("question_policy_depth", 4)
+    strategy = config.get("question_strategy", "avg_max")
+    catalog = get_catalog()
+
+    policy = {
+        "version": catalog.version,
+        "features": config["key_features"],
+        "strategy": strategy,
+        "depth": depth,
+        "tree": build_node(catalog, {}, config, strategy, depth),
+    }
+    path = config.get("question_policy", "data/question_policy.json")
+    with open(path, "w") as file:
+        json.dump(policy, file, separators=(',', ':'))
+    print(f"{count_nodes(policy['tree'])} nodes written to {path} ({os.path.getsize(path)} bytes)")
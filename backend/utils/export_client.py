@@ -0,0 +1,55 @@
+# downloads conversations from GET /export as ndjson, one conversation per line
+# usage (from backend/): EXPORT_TOKEN=... python -m utils.export_client --url http://localhost:5000 --since 2026-10-01 --game-mode true --gzip --out conversations.ndjson
+import argparse
+import os
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from dotenv import load_dotenv
+
+READ_SIZE = 64 * 1024
+
+if __name__ == '__main__':
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="stream the collected conversations to a file")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--token", default=os.getenv("EXPORT_TOKEN"), help="defaults to EXPORT_TOKEN")
+    parser.add_argument("--since", help="unix seconds or ISO 8601, UTC unless an offset is given")
+    parser.add_argument("--until", help="unix seconds or ISO 8601, excluded")
+    parser.add_argument("--game-mode", choices=("true", "false"))
+    parser.add_argument("--gzip", action="store_true", help="compress the transfer")
+    parser.add_argument("--keep-gzip", action="store_true", help="write the gzipped stream as is")
+    parser.add_argument("--out", help="output file, default stdout")
+    args = parser.parse_args()
+    if not args.token:
+        parser.error("no token, pass --token or set EXPORT_TOKEN")
+
+    query = {key: value for key, value in (("since", args.since), ("until", args.until), ("game_mode", args.game_mode),
+                                           ("gzip", "1" if args.gzip or args.keep_gzip else None)) if value}
+    request = urllib.request.Request(f"{args.url.rstrip('/')}/export?{urllib.parse.urlencode(query)}",
+                                     headers={"Authorization": f"Bearer {args.token}"})
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    lines = 0
+    try:
+        with urllib.request.urlopen(request) as response:
+            gzipped = response.headers.get("Content-Encoding") == "gzip"
+            decompressor = zlib.decompressobj(wbits=31) if gzipped and not args.keep_gzip else None
+            while True:
+                chunk = response.read(READ_SIZE)
+                if not chunk:
+                    break
+                if decompressor:
+                    chunk = decompressor.decompress(chunk)
+                if not gzipped or decompressor:
+                    lines += chunk.count(b"\n")
+                out.write(chunk)
+            if decompressor:
+                out.write(decompressor.flush())
+    except urllib.error.HTTPError as e:
+        sys.exit(f"export failed: {e.code} {e.read().decode(errors='replace')}")
+    finally:
+        if args.out:
+            out.close()
+    print(f"exported {lines} conversations" if not args.keep_gzip else "exported gzipped conversations", file=sys.stderr)
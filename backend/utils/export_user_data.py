@@ -0,0 +1,16 @@
+# writes the conversation log as the json array data/user_data.json used to be
+# usage (from backend/): python -m utils.export_user_data [output, default stdout]
+import json
+import sys
+from src.analytics_log import export_json
+
+if __name__ == '__main__':
+    with open('config.json') as config_file:
+        directory = (json.load(config_file).get("user_data_log") or {}).get("directory", "data/user_data")
+    counts = {}
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as out:
+            count = export_json(out, directory, counts=counts)
+    else:
+        count = export_json(sys.stdout, directory, counts=counts)
+    print(f"exported {count} conversations, skipped {counts.get('skipped', 0)} undecodable log lines", file=sys.stderr)
@@ -0,0 +1,239 @@
+# local stand-in for the anthropic messages api, used to load test the backend without api credits
+# usage (from backend/): python -m utils.mock_anthropic --port 8090 --latency lognormal:-0.5,0.4 --error-rate 0.01
+# then set "base_url": "http://localhost:8090" in the llm section of config.json (or ANTHROPIC_BASE_URL)
+# streaming (sse), stop_sequences and forced tool calls are supported
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from src.lexicon import Lexicon
+from src.utils import server_setup
+
+#characters per streamed text delta
+STREAM_CHUNK = 8
+FIRST_TOKEN_SHARE = 0.3
+SUMMARY_TEXT = "This charming little bird is a delight to spot, with its lovely colours and busy, cheerful manner."
+
+def parse_latency(spec: str):
+    """this function turns 'fixed:0.5', 'uniform:0.2,1.5' or 'lognormal:mu,sigma' into a sampler (seconds)"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(values[0], values[1])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def apply_stop_sequences(text: str, stop_sequences: list) -> tuple:
+    """this function cuts the text at the first stop sequence, returning (text, matched sequence)"""
+    cuts = [(text.find(sequence), sequence) for sequence in stop_sequences or [] if sequence in text]
+    if not cuts:
+        return text, None
+    position, sequence = min(cuts)
+    return text[:position], sequence
+
+def to_xml(categories: dict) -> str:
+    fields = "".join(f"\n    <{feature}>{value}</{feature}>" for feature, value in categories.items())
+    return f"<bird_sighting>{fields}\n</bird_sighting>"
+
+
+class MockState:
+    def __init__(self, args):
+        self.latency = parse_latency(args.latency)
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.max_rpm = args.max_rpm
+        self.canned = {}
+        if args.canned:
+            with open(args.canned) as file:
+                self.canned = {key.strip().lower(): value for key, value in json.load(file).items()}
+        self.lexicon = Lexicon(server_setup(args.features))
+        self.cached_prefixes = set()
+        self.window = []
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def rate_limited(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            if random.random() < self.rate_limit_rate:
+                return True
+            if not self.max_rpm:
+                return False
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 60]
+            if len(self.window) >= self.max_rpm:
+                return True
+            self.window.append(now)
+            return False
+
+    def usage(self, body: dict, output: str) -> dict:
+        """this function approximates token counts, simulating the prompt cache of tools and system blocks"""
+        usage = {"input_tokens": 0, "output_tokens": count_tokens(output),
+                 "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        system = body.get("system") or []
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        #tools are part of the prompt too, before the system blocks
+        blocks = [(json.dumps(tool), tool.get("cache_control")) for tool in body.get("tools") or []]
+        blocks += [(block.get("text", ""), block.get("cache_control")) for block in system]
+        for text, cache_control in blocks:
+            tokens = count_tokens(text)
+            if not cache_control:
+                usage["input_tokens"] += tokens
+                continue
+            key = hashlib.sha1(text.encode()).hexdigest()
+            with self.lock:
+                hit = key in self.cached_prefixes
+                self.cached_prefixes.add(key)
+            usage["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] += tokens
+        for message in body.get("messages", []):
+            usage["input_tokens"] += count_tokens(json.dumps(message.get("content", "")))
+        return usage
+
+    def user_text(self, body: dict) -> str:
+        return " ".join(block.get("text", "") if isinstance(block, dict) else str(block)
+                        for message in body.get("messages", [])
+                        for block in (message["content"] if isinstance(message["content"], list) else [message["content"]]))
+
+    def reply(self, body: dict) -> str:
+        text = self.user_text(body)
+        user_input = re.search(r"<user_input>\s*(.*?)\s*</user_input>", text, re.S)
+        if not user_input:
+            return SUMMARY_TEXT
+        user_input = user_input.group(1)
+        if user_input.strip().lower() in self.canned:
+            return self.canned[user_input.strip().lower()]
+        category = re.search(r"for this category : (\w+)", text)
+        return to_xml(self.lexicon.extract_known(user_input, category.group(1) if category else None))
+
+    def tool_input(self, body: dict) -> dict:
+        """this function answers a forced tool call with the categories as lists of enum values"""
+        text = self.user_text(body)
+        user_input = re.search(r"<user_input>\s*(.*?)\s*</user_input>", text, re.S)
+        category = re.search(r"for this category : (\w+)", text)
+        known = self.lexicon.extract_known(user_input.group(1) if user_input else text, category.group(1) if category else None)
+        return {feature: value.split(", ") for feature, value in known.items()}
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, payload: dict, headers: dict=None) -> None:
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_event(self, event: str, data: dict) -> None:
+            chunk = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+
+        def send_stream(self, message: dict, text: str, chunk_delay: float) -> None:
+            """this function replays a message as server sent events, a few characters per delta"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            usage = message["usage"]
+            self.send_event("message_start", {"type": "message_start", "message": dict(
+                message, content=[], stop_reason=None, stop_sequence=None, usage=dict(usage, output_tokens=1))})
+            self.send_event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                    "content_block": {"type": "text", "text": ""}})
+            for i in range(0, len(text), STREAM_CHUNK):
+                time.sleep(chunk_delay)
+                self.send_event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                        "delta": {"type": "text_delta", "text": text[i:i + STREAM_CHUNK]}})
+            self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            self.send_event("message_delta", {"type": "message_delta", "usage": {"output_tokens": usage["output_tokens"]},
+                                              "delta": {"stop_reason": message["stop_reason"],
+                                                        "stop_sequence": message["stop_sequence"]}})
+            self.send_event("message_stop", {"type": "message_stop"})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def send_error_json(self, status: int, kind: str, message: str, headers: dict=None) -> None:
+            self.send_json(status, {"type": "error", "error": {"type": kind, "message": message}}, headers)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.split("?")[0] != "/v1/messages":
+                return self.send_error_json(404, "not_found_error", f"unknown path {self.path}")
+            if state.rate_limited():
+                return self.send_error_json(429, "rate_limit_error", "mock rate limit", {"retry-after": "1"})
+            latency = max(0.0, state.latency())
+            #a streamed answer spends part of the latency before the first token and the rest writing it
+            time.sleep(latency * FIRST_TOKEN_SHARE if body.get("stream") else latency)
+            if random.random() < state.error_rate:
+                return self.send_error_json(529, "overloaded_error", "mock overloaded")
+
+            tool_choice = body.get("tool_choice") or {}
+            if body.get("tools") and tool_choice.get("type") == "tool":
+                tool_input = state.tool_input(body)
+                return self.send_json(200, {
+                    "id": f"msg_mock_{uuid.uuid4().hex[:24]}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": body.get("model", "mock"),
+                    "content": [{"type": "tool_use", "id": f"toolu_mock_{uuid.uuid4().hex[:24]}",
+                                 "name": tool_choice["name"], "input": tool_input}],
+                    "stop_reason": "tool_use",
+                    "stop_sequence": None,
+                    "usage": state.usage(body, json.dumps(tool_input)),
+                })
+
+            text, stop_sequence = apply_stop_sequences(state.reply(body), body.get("stop_sequences"))
+            message = {
+                "id": f"msg_mock_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model", "mock"),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "stop_sequence" if stop_sequence else "end_turn",
+                "stop_sequence": stop_sequence,
+                "usage": state.usage(body, text),
+            }
+            if body.get("stream"):
+                chunks = max(1, -(-len(text) // STREAM_CHUNK))
+                return self.send_stream(message, text, latency * (1 - FIRST_TOKEN_SHARE) / chunks)
+            self.send_json(200, message)
+
+    return Handler
+
+if __name__ == '__main__':
+    load_dotenv()
+    with open('config.json') as config_file:
+        config = json.load(config_file)
+    parser = argparse.ArgumentParser(description="local stand-in for the anthropic messages api")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:s | uniform:min,max | lognormal:mu,sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 529 overloaded answers")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of 429 answers")
+    parser.add_argument("--max-rpm", type=int, default=0, help="answer 429 above this many requests per minute")
+    parser.add_argument("--canned", help="json file mapping user inputs to raw responses")
+    parser.add_argument("--features", nargs="*", default=config["key_features"])
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockState(args)))
+    print(f"mock anthropic api listening on http://{args.host}:{args.port}")
+    server.serve_forever()
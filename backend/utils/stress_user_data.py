@@ -0,0 +1,90 @@
+# hammers the conversation log from several processes and checks that no record is lost, duplicated or torn
+# usage (from backend/): python -m utils.stress_user_data --processes 8 --records 2000 --mode batched
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from src import formatData
+from src.analytics_log import list_segments
+
+def worker(number: int, args, acked) -> None:
+    """this function saves records the way /birds does, acked[number] counts the ones accepted"""
+    log = formatData.configure_log({"directory": args.directory, "fsync": args.fsync,
+                                    "max_segment_bytes": args.segment_bytes})
+    #the queue holds every record so none is dropped, any loss is a bug
+    writer = formatData.configure_writer({"max_queue": args.records, "batch_size": 50,
+                                          "flush_interval": 0.05}) if args.mode == "batched" else None
+    #like a gunicorn worker, SIGTERM ends the process through a clean exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for i in range(args.records):
+            data = formatData.formatData({"size": "small"}, f"stress {number} {i}", None)
+            formatData.save_user_data(data, [{"name": "robin"}])
+            acked[number] = i + 1
+    finally:
+        #multiprocessing children skip atexit, drain explicitly like the atexit hook would
+        if writer:
+            writer.close()
+        log.close()
+
+def check(directory: str, acked: list) -> dict:
+    """this function reads every segment line by line and compares it to what the workers acked"""
+    seen = {}
+    torn = duplicates = 0
+    for path in list_segments(directory):
+        with open(path, "rb") as file:
+            for line in file:
+                try:
+                    text = json.loads(line)["user_data"]["conversation"][0]["text"]
+                    _, number, i = text.split(" ")
+                except (ValueError, KeyError, IndexError):
+                    torn += 1
+                    continue
+                key = (int(number), int(i))
+                duplicates += key in seen
+                seen[key] = True
+    missing = sum(1 for number, count in enumerate(acked) for i in range(count) if (number, i) not in seen)
+    return {"records": len(seen), "acked": sum(acked), "missing": missing, "duplicates": duplicates,
+            "torn_lines": torn, "segments": len(list_segments(directory))}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="multi process stress test of the conversation log")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--records", type=int, default=2000, help="records per process")
+    parser.add_argument("--mode", choices=("direct", "batched"), default="batched")
+    parser.add_argument("--fsync", choices=("always", "interval", "never"), default="interval")
+    parser.add_argument("--segment-bytes", type=int, default=256 * 1024, help="small to force concurrent rotations")
+    parser.add_argument("--sigterm-after", type=float, help="send SIGTERM to the workers after this many seconds")
+    parser.add_argument("--directory", help="log directory, a temporary one by default")
+    args = parser.parse_args()
+
+    temporary = args.directory is None
+    args.directory = args.directory or tempfile.mkdtemp(prefix="user_data_stress_")
+    acked = multiprocessing.Array("i", args.processes)
+    start = time.monotonic()
+    processes = [multiprocessing.Process(target=worker, args=(n, args, acked)) for n in range(args.processes)]
+    for process in processes:
+        process.start()
+    if args.sigterm_after is not None:
+        time.sleep(args.sigterm_after)
+        for process in processes:
+            os.kill(process.pid, signal.SIGTERM)
+    for process in processes:
+        process.join()
+    elapsed = time.monotonic() - start
+
+    result = check(args.directory, list(acked))
+    print(json.dumps(dict(result, mode=args.mode, fsync=args.fsync, seconds=round(elapsed, 2),
+                          records_per_second=round(result["records"] / elapsed)), indent=4))
+    if temporary:
+        shutil.rmtree(args.directory)
+    #a SIGTERM can land between a save and its ack, so each process may have one record more than acked
+    extra = result["records"] - result["acked"]
+    ok = not (result["missing"] or result["duplicates"] or result["torn_lines"]) and 0 <= extra <= args.processes
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)